@@ -1,33 +1,65 @@
+import os
+import csv
+import json
+import random
+import heapq
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import pygame
 import math
+import time
+from collections import OrderedDict, deque
 
-pygame.init()
-pygame.mixer.init()
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # -------------------------------------------------------------------
-# Constants
+# Lazy setup and constants
 # -------------------------------------------------------------------
 
-KEY_MAP = {
-    # Arrow keys and control keys
-    "up": pygame.K_UP, "down": pygame.K_DOWN, "left": pygame.K_LEFT, "right": pygame.K_RIGHT,
-    "space": pygame.K_SPACE, "escape": pygame.K_ESCAPE,
+# pygame subsystems are started on first use rather than at import: the
+# mixer by load_sound, fonts by text, the display by Game.
 
-    # Special keys
-    "enter": pygame.K_RETURN, "tab": pygame.K_TAB,
-    "shift": pygame.K_LSHIFT, "shift_r": pygame.K_RSHIFT,
+def _init_mixer():
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
 
-    # Common punctuation and symbols
-    ",": pygame.K_COMMA, ".": pygame.K_PERIOD, "/": pygame.K_SLASH,
-    "-": pygame.K_MINUS, "=": pygame.K_EQUALS,
-    "[": pygame.K_LEFTBRACKET, "]": pygame.K_RIGHTBRACKET,
-    "\\": pygame.K_BACKSLASH, "'": pygame.K_QUOTE, ";": pygame.K_SEMICOLON,
-    "`": pygame.K_BACKQUOTE
-}
+def _init_font():
+    if not pygame.font.get_init():
+        pygame.font.init()
+
+_KEY_MAP = {}
+
+def _key_code(key_name):
+    if not _KEY_MAP:
+        _KEY_MAP.update({
+            # Arrow keys and control keys
+            "up": pygame.K_UP, "down": pygame.K_DOWN, "left": pygame.K_LEFT, "right": pygame.K_RIGHT,
+            "space": pygame.K_SPACE, "escape": pygame.K_ESCAPE,
+
+            # Special keys
+            "enter": pygame.K_RETURN, "tab": pygame.K_TAB,
+            "shift": pygame.K_LSHIFT, "shift_r": pygame.K_RSHIFT,
+
+            # Common punctuation and symbols
+            ",": pygame.K_COMMA, ".": pygame.K_PERIOD, "/": pygame.K_SLASH,
+            "-": pygame.K_MINUS, "=": pygame.K_EQUALS,
+            "[": pygame.K_LEFTBRACKET, "]": pygame.K_RIGHTBRACKET,
+            "\\": pygame.K_BACKSLASH, "'": pygame.K_QUOTE, ";": pygame.K_SEMICOLON,
+            "`": pygame.K_BACKQUOTE
+        })
+        # Add letter and number keys dynamically
+        _KEY_MAP.update({chr(c): getattr(pygame, f"K_{chr(c)}") for c in range(ord('a'), ord('z') + 1)})
+        _KEY_MAP.update({str(i): getattr(pygame, f"K_{i}") for i in range(10)})
+    return _KEY_MAP.get(key_name)
 
-# Add letter and number keys dynamically
-KEY_MAP.update({chr(c): getattr(pygame, f"K_{chr(c)}") for c in range(ord('a'), ord('z') + 1)})
-KEY_MAP.update({str(i): getattr(pygame, f"K_{i}") for i in range(10)})
+def __getattr__(name):
+    if name == "KEY_MAP":
+        _key_code(None)
+        return _KEY_MAP
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # -------------------------------------------------------------------
@@ -45,18 +77,50 @@ class InputManager:
 
         self.mouse_buttons_down = set()
         self.mouse_buttons_released = set()
+        self.mouse_buttons_held = set()
         self.mouse_position = (0, 0)
 
+        # When not live (headless games), input comes only from events
+        # queued with queue_event() instead of from pygame
+        self.live = True
+        self.queued_events = []
+
+        # Recording keeps one row per frame that had any input; replaying
+        # feeds such rows back in place of real input
+        self.recording = None
+        self.record_start = 0
+        self.record_seed = None
+        self.replaying = None
+        self.replay_start = 0
+
+    def queue_event(self, event_type, **attributes):
+        self.queued_events.append(pygame.event.Event(event_type, **attributes))
+
     def update(self, frame_count):
-        self.mouse_motion = pygame.mouse.get_rel()
         # Clear keys that were newly pressed or released in the previous frame
         self.keys_pressed.clear()
         self.keys_released.clear()
         self.mouse_buttons_down.clear()
         self.mouse_buttons_released.clear()
-        self.mouse_position = pygame.mouse.get_pos()
 
-        for event in pygame.event.get():
+        if self.replaying is not None:
+            events = self._replayed_events(frame_count)
+        elif self.live:
+            self.mouse_motion = pygame.mouse.get_rel()
+            self.mouse_position = pygame.mouse.get_pos()
+            events = pygame.event.get()
+        else:
+            self.mouse_motion = (0, 0)
+            events = []
+        events.extend(self.queued_events)
+        self.queued_events.clear()
+        self._handle_events(events, frame_count)
+
+        if self.recording is not None:
+            self._record(events, frame_count)
+
+    def _handle_events(self, events, frame_count):
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
@@ -69,11 +133,60 @@ class InputManager:
                     del self.keys_held[event.key]
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 self.mouse_buttons_down.add(event.button)
+                self.mouse_buttons_held.add(event.button)
             elif event.type == pygame.MOUSEBUTTONUP:
                 self.mouse_buttons_released.add(event.button)
+                self.mouse_buttons_held.discard(event.button)
+            elif event.type == pygame.MOUSEMOTION and not self.live:
+                old_x, old_y = self.mouse_position
+                self.mouse_position = event.pos
+                self.mouse_motion = (self.mouse_motion[0] + event.pos[0] - old_x,
+                                     self.mouse_motion[1] + event.pos[1] - old_y)
+
+    # Event codes used in recordings
+    _RECORDED = {pygame.KEYDOWN: "kd", pygame.KEYUP: "ku",
+                 pygame.MOUSEBUTTONDOWN: "md", pygame.MOUSEBUTTONUP: "mu"}
+
+    def _record(self, events, frame_count):
+        codes = []
+        for event in events:
+            code = self._RECORDED.get(event.type)
+            if code is not None:
+                codes.append([code, event.key if code[0] == "k" else event.button])
+        last = self.recording[-1] if self.recording else None
+        last_position = tuple(last[2]) if last else (0, 0)
+        if codes or self.mouse_position != last_position or self.mouse_motion != (0, 0):
+            self.recording.append([frame_count - self.record_start, codes,
+                                   list(self.mouse_position), list(self.mouse_motion)])
+
+    def _replayed_events(self, frame_count):
+        if self.live:
+            # Keep the window responsive, but ignore its input
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    exit()
+
+        row = self.replaying.get(frame_count - self.replay_start)
+        if row is None:
+            self.mouse_motion = (0, 0)
+            return []
+        self.mouse_position = tuple(row[2])
+        self.mouse_motion = tuple(row[3])
+        events = []
+        for code, value in row[1]:
+            if code == "kd":
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=value))
+            elif code == "ku":
+                events.append(pygame.event.Event(pygame.KEYUP, key=value))
+            elif code == "md":
+                events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=value))
+            elif code == "mu":
+                events.append(pygame.event.Event(pygame.MOUSEBUTTONUP, button=value))
+        return events
 
     def is_key_pressed(self, key_name, frame_count):
-        key = KEY_MAP.get(key_name)
+        key = _key_code(key_name)
         if key is None:
             return False
         if key in self.keys_held:
@@ -86,11 +199,11 @@ class InputManager:
         return key in self.keys_pressed
 
     def is_key_held(self, key_name):
-        key = KEY_MAP.get(key_name)
+        key = _key_code(key_name)
         return key in self.keys_held
 
     def set_key_cooldown(self, key_name, frames):
-        key = KEY_MAP.get(key_name)
+        key = _key_code(key_name)
         if key:
             self.key_cooldowns[key] = frames
 
@@ -101,177 +214,2495 @@ class InputManager:
         return button in self.mouse_buttons_released
 
     def is_mouse_held(self, button):
+        if not self.live or self.replaying is not None:
+            return button in self.mouse_buttons_held
         return pygame.mouse.get_pressed()[button - 1]
 
     def get_mouse_position(self):
         return self.mouse_position
 
-_input = InputManager()
+# -------------------------------------------------------------------
+# Spatial hash (broadphase for collision queries)
+# -------------------------------------------------------------------
+
+class SpatialHash:
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.ranges = {}  # entity -> cell range it is filed under
+
+    def clear(self):
+        self.cells.clear()
+        self.ranges.clear()
+
+    def _cell_range(self, x, y, width, height):
+        size = self.cell_size
+        return (int(x // size), int((x + width) // size),
+                int(y // size), int((y + height) // size))
+
+    def insert(self, entity):
+        cells = self.cells
+        x0, x1, y0, y1 = self.ranges[entity] = self._cell_range(*_bounds(entity))
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    cells[(cx, cy)] = [entity]
+                else:
+                    bucket.append(entity)
+
+    def rebuild(self, entities):
+        self.clear()
+        cells = self.cells
+        ranges = self.ranges
+        size = self.cell_size
+        for entity in entities:
+            if not entity.alive:
+                continue
+            if entity.continuous:
+                self.insert(entity)
+                continue
+            # insert() inlined: this runs for every entity once a frame
+            x = entity._x
+            y = entity._y
+            x0 = int(x // size)
+            x1 = int((x + entity._width) // size)
+            y0 = int(y // size)
+            y1 = int((y + entity._height) // size)
+            ranges[entity] = (x0, x1, y0, y1)
+            if x0 == x1 and y0 == y1:
+                bucket = cells.get((x0, y0))
+                if bucket is None:
+                    cells[(x0, y0)] = [entity]
+                else:
+                    bucket.append(entity)
+                continue
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket is None:
+                        cells[(cx, cy)] = [entity]
+                    else:
+                        bucket.append(entity)
+
+    def move(self, entity):
+        # File an entity again after it moved or changed size
+        cell_range = self.ranges.pop(entity, None)
+        if cell_range is not None:
+            x0, x1, y0, y1 = cell_range
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    bucket = self.cells[(cx, cy)]
+                    bucket.remove(entity)
+                    if not bucket:
+                        del self.cells[(cx, cy)]
+            if entity.alive:
+                self.insert(entity)
+
+    def query(self, x, y, width, height):
+        # Candidates only: callers still do the exact overlap test
+        cells = self.cells
+        found = {}
+        x0, x1, y0, y1 = self._cell_range(x, y, width, height)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    for entity in bucket:
+                        found[id(entity)] = entity
+        return found.values()
+
+# -------------------------------------------------------------------
+# Input recording and replay
+# A recording is JSON: the random seed, how many frames were recorded,
+# and one [frame, events, mouse position, mouse motion] row for each
+# frame that had input. Call start_recording() or load_replay() before
+# setting up the game so the seed covers all random choices.
+# -------------------------------------------------------------------
+
+def start_recording(seed=None):
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    random.seed(seed)
+    manager = _world.input
+    manager.recording = []
+    manager.record_start = _world.frame_count
+    manager.record_seed = seed
+    return seed
+
+def save_recording(path):
+    manager = _world.input
+    if manager.recording is None:
+        raise RuntimeError("Call start_recording() before save_recording().")
+    data = {
+        "seed": manager.record_seed,
+        "frames": _world.frame_count - manager.record_start,
+        "input": manager.recording,
+    }
+    with open(path, "w") as file:
+        json.dump(data, file, separators=(",", ":"))
+
+def load_replay(path):
+    # Returns the number of recorded frames, e.g. for Game.run(frames=...)
+    with open(path) as file:
+        data = json.load(file)
+    random.seed(data["seed"])
+    manager = _world.input
+    manager.replaying = {row[0]: row for row in data["input"]}
+    manager.replay_start = _world.frame_count
+    return data["frames"]
+
+def stop_replay():
+    _world.input.replaying = None
+
+# -------------------------------------------------------------------
+# Timers
+# after() and every() call a function once or repeatedly some frames
+# (or seconds of game time) from now. Timers wait in a heap ordered by
+# when they are due, so each frame only looks at the ones due now.
+# Timers belong to the world, so a suspended scene's timers wait too.
+# -------------------------------------------------------------------
+
+class Timer:
+    __slots__ = ("function", "interval", "repeat", "seconds", "cancelled")
+
+    def __init__(self, function, interval, repeat, seconds):
+        self.function = function
+        self.interval = interval
+        self.repeat = repeat
+        self.seconds = seconds
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Scheduler:
+    def __init__(self):
+        self.frame = 0
+        self.time = 0.0  # seconds of game time this world has run
+        self.by_frame = []  # heap of (due frame, order, timer)
+        self.by_time = []  # heap of (due time, order, timer)
+        self.order = 0  # timers due together run in the order they were made
+
+    def add(self, delay, function, repeat=False, seconds=False):
+        if repeat and delay <= 0:
+            raise ValueError("A repeating timer needs an interval above 0")
+        timer = Timer(function, delay, repeat, seconds)
+        self._push(timer, (self.time if seconds else self.frame) + delay)
+        return timer
+
+    def _push(self, timer, due):
+        self.order += 1
+        heapq.heappush(self.by_time if timer.seconds else self.by_frame, (due, self.order, timer))
+
+    def run(self, seconds):
+        # Once per frame: advance the clocks and call whatever is due
+        self.frame += 1
+        self.time += seconds
+        for heap, now in ((self.by_frame, self.frame), (self.by_time, self.time + 1e-9)):
+            while heap and heap[0][0] <= now:
+                due, _, timer = heapq.heappop(heap)
+                if timer.cancelled:
+                    continue
+                if timer.repeat:
+                    self._push(timer, due + timer.interval)
+                timer.function()
+
+def after(frames, function):
+    return _world.scheduler.add(frames, function)
+
+def every(frames, function):
+    return _world.scheduler.add(frames, function, repeat=True)
+
+def after_seconds(seconds, function):
+    # Game time: a frame is 1/fps seconds (1/tick_rate with fixed_timestep)
+    return _world.scheduler.add(seconds, function, seconds=True)
+
+def every_seconds(seconds, function):
+    return _world.scheduler.add(seconds, function, repeat=True, seconds=True)
+
+# -------------------------------------------------------------------
+# Tweens
+# tween() moves entity attributes to target values over some frames.
+# Every running tween is a row in one set of columns (entity, attribute,
+# start, end, first frame, length, easing) and all rows are advanced in
+# a single pass per frame, vectorized when NumPy is available.
+# -------------------------------------------------------------------
+
+# Built-in easings are plain arithmetic, so they work on NumPy arrays too
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: t * (2 - t),
+    "ease_in_out": lambda t: t * t * (3 - 2 * t),
+}
+_ARRAY_EASINGS = set(EASINGS.values())
+
+class Tween:
+    def __init__(self, tweener, entity, targets, frames, easing, on_complete):
+        self.tweener = tweener
+        self.entity = entity
+        self.targets = targets
+        self.frames = max(int(frames), 1)
+        self.easing = easing
+        self.on_complete = on_complete
+        self.rows = 0  # attributes still animating
+        self.chained = []
+        self.done = False
+        self.cancelled = False
+
+    def then(self, frames=30, easing="linear", on_complete=None, **targets):
+        # Another tween of the same entity, started when this one finishes
+        tween = Tween(self.tweener, self.entity, targets, frames, easing, on_complete)
+        if self.done:
+            self.tweener.start(tween)
+        else:
+            self.chained.append(tween)
+        return tween
+
+    def cancel(self):
+        # Stops where it is; on_complete and chained tweens don't run
+        self.cancelled = True
+        self.tweener.changed = True
+
+class Tweener:
+    COLUMNS = ("entities", "attributes", "starts", "ends", "begins", "lengths", "easing_ids", "tweens")
+
+    def __init__(self):
+        self.frame = 0
+        self.easings = {}  # easing id -> function, for easings some row uses
+        self.easing_ids_by_function = {}
+        self.next_easing_id = 0
+        # One row per animated attribute, in parallel lists
+        for name in self.COLUMNS:
+            setattr(self, name, [])
+        self.arrays = None  # NumPy copies of the numeric columns, until rows change
+        self.changed = False  # a tween was cancelled: drop its rows
+
+    def _easing_id(self, easing):
+        # Names are looked up on every call, so easings added to EASINGS
+        # later work too
+        if isinstance(easing, str):
+            if easing not in EASINGS:
+                raise ValueError(f"Unknown easing {easing!r}; use one of {', '.join(EASINGS)} or a function")
+            easing = EASINGS[easing]
+        easing_id = self.easing_ids_by_function.get(easing)
+        if easing_id is None:
+            easing_id = self.easing_ids_by_function[easing] = self.next_easing_id
+            self.easings[easing_id] = easing
+            self.next_easing_id += 1
+        return easing_id
+
+    def start(self, tween):
+        easing_id = self._easing_id(tween.easing)
+        for attribute, end in tween.targets.items():
+            self.entities.append(tween.entity)
+            self.attributes.append(attribute)
+            self.starts.append(getattr(tween.entity, attribute))
+            self.ends.append(end)
+            self.begins.append(self.frame)
+            self.lengths.append(tween.frames)
+            self.easing_ids.append(easing_id)
+            self.tweens.append(tween)
+        self.arrays = None
+        tween.rows = len(tween.targets)
+        if not tween.rows:
+            self._finish(tween)
+
+    def _values(self):
+        # The value of every row this frame, and which rows have finished
+        # (None when none have)
+        frame = self.frame
+        if np is not None and len(self.entities) >= 32:
+            if self.arrays is None:
+                easing_ids = np.array(self.easing_ids)
+                easings = [(self.easings[easing_id], self.easings[easing_id] in _ARRAY_EASINGS,
+                            easing_ids == easing_id)
+                           for easing_id in np.unique(easing_ids).tolist()]
+                self.arrays = (np.array(self.starts, dtype=float), np.array(self.ends, dtype=float),
+                               np.array(self.begins), np.array(self.lengths), easings)
+            starts, ends, begins, lengths, easings = self.arrays
+            done = np.minimum((frame - begins) / lengths, 1.0)
+            eased = np.empty(len(done))
+            for easing, vectorized, rows in easings:
+                eased[rows] = easing(done[rows]) if vectorized else [easing(t) for t in done[rows].tolist()]
+            finished = done >= 1.0
+            values = np.where(finished, ends, starts + (ends - starts) * eased)
+            return values.tolist(), finished.tolist() if finished.any() else None
+
+        easings = self.easings
+        values = []
+        finished = None
+        for row, (start, end, begin, length, easing_id) in enumerate(
+                zip(self.starts, self.ends, self.begins, self.lengths, self.easing_ids)):
+            t = (frame - begin) / length
+            if t >= 1.0:
+                values.append(end)
+                if finished is None:
+                    finished = [False] * len(self.entities)
+                finished[row] = True
+            else:
+                values.append(start + (end - start) * easings[easing_id](t))
+        return values, finished
+
+    def _keep(self, rows):
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, [column[row] for row in rows])
+        self.arrays = None
+        # Forget easings no row uses any more, such as one-off lambdas
+        used = set(self.easing_ids)
+        if len(used) < len(self.easings):
+            for easing_id in [easing_id for easing_id in self.easings if easing_id not in used]:
+                del self.easing_ids_by_function[self.easings.pop(easing_id)]
+
+    def step(self):
+        self.frame += 1
+        if self.changed:
+            self.changed = False
+            self._keep([row for row, tween in enumerate(self.tweens) if not tween.cancelled])
+        if not self.entities:
+            return
+        values, finished = self._values()
+        for entity, attribute, value in zip(self.entities, self.attributes, values):
+            setattr(entity, attribute, value)
+        if finished is None:
+            return
+
+        keep = []
+        completed = []
+        for row, tween in enumerate(self.tweens):
+            if not tween.entity.alive:
+                continue  # dropped quietly, without on_complete
+            if finished[row]:
+                tween.rows -= 1
+                if not tween.rows:
+                    completed.append(tween)
+            else:
+                keep.append(row)
+        self._keep(keep)
+        for tween in completed:
+            self._finish(tween)
+
+    def _finish(self, tween):
+        tween.done = True
+        if tween.on_complete is not None:
+            tween.on_complete()
+        for chained in tween.chained:
+            self.start(chained)
+
+    def stop(self, entity):
+        for tween in self.tweens:
+            if tween.entity is entity:
+                tween.cancel()
+
+    def drop(self, dead):
+        # Cancel the tweens of entities that died, before a pool can hand
+        # them out again
+        if not self.tweens:
+            return
+        dead = set(dead)
+        for tween in self.tweens:
+            if tween.entity in dead:
+                tween.cancel()
+
+def tween(entity, frames=30, easing="linear", on_complete=None, **targets):
+    # e.g. tween(box, x=300, y=50, frames=60, easing="ease_out").then(x=0)
+    new_tween = Tween(_world.tweens, entity, targets, frames, easing, on_complete)
+    _world.tweens.start(new_tween)
+    return new_tween
+
+def stop_tweens(entity):
+    _world.tweens.stop(entity)
+
+# -------------------------------------------------------------------
+# World: all per-game state, so several games can exist one after
+# another (or side by side in worker processes)
+# -------------------------------------------------------------------
+
+class World:
+    def __init__(self):
+        self.entities = []
+        self.behaviors = []
+        self.game_over = False
+        self.end_message = None
+        self.score = 0
+        self.frame_count = 0
+        self.input = InputManager()
+        self.spatial = SpatialHash()
+        self.spatial_dirty = True  # rebuild the grid on the next query
+        self.moved = []  # entities moved by hand since the grid was built
+        self.store = None
+        self.screen_size = (800, 600)
+        self.bounds = (800, 600)  # entities leaving this area die; the screen unless there is a camera
+        self.text_queue = []  # (surface, rect) pairs drawn by the next render
+        self.pool = None  # EntityPool, when pooling is turned on
+        self.collision_rules = []  # (group_a, group_b, handler, when)
+        self.contacts = {}  # (group_a, group_b) -> pairs touching last frame
+        self.groups = {}  # group name -> list of its entities
+        self.tilemap = None
+        self.camera = None
+        self.deaths = False  # set by destroy() and the camera when something dies
+        self.scheduler = Scheduler()
+        self.tweens = Tweener()
+
+    def add(self, entity):
+        self.entities.append(entity)
+        if self.camera is not None and self.camera.offscreen == "sleep":
+            self.camera.add(entity)
+        if entity.group is not None:
+            members = self.groups.get(entity.group)
+            if members is None:
+                self.groups[entity.group] = [entity]
+            else:
+                members.append(entity)
+
+    def moved_by_hand(self, entity):
+        # x, y, width or height was set outside update(): refile it in the
+        # grid, and wake it if the camera has it asleep in another cell
+        self.moved.append(entity)
+        camera = self.camera
+        if camera is not None and entity in camera.asleep:
+            camera.add(entity)  # the next camera step puts it back to sleep if still out of view
+
+    def remove_dead(self):
+        # Once per frame, after entities have moved: drop dead entities
+        # from the entity list and from only those groups that lost some
+        if self.store is not None:
+            dead = self.store.collect()
+            if not dead:
+                return
+            # Detached entities have _index -1; much cheaper than .alive here
+            self.entities = [entity for entity in self.entities if entity._index >= 0]
+            for group in {entity.group for entity in dead if entity.group is not None}:
+                self.groups[group] = [entity for entity in self.groups[group] if entity._index >= 0]
+            self.tweens.drop(dead)
+            return
+
+        if self.camera is not None and self.camera.offscreen == "sleep":
+            # Most entities are asleep and can't die by moving, so only
+            # look through them all when something is known to have died
+            if not self.deaths:
+                return
+            self.deaths = False
+        dead = [entity for entity in self.entities if not entity.alive]
+        if not dead:
+            return
+        self.entities = [entity for entity in self.entities if entity.alive]
+        for group in {entity.group for entity in dead if entity.group is not None}:
+            self.groups[group] = [entity for entity in self.groups[group] if entity.alive]
+        self.tweens.drop(dead)
+        if self.pool is not None:
+            self.pool.release(dead)
+
+    def active_entities(self):
+        # The entities to update this frame: all of them, or with a sleeping
+        # camera only those near the view
+        if self.camera is not None and self.camera.offscreen == "sleep":
+            return self.camera.awake
+        return self.entities
+
+    def spatial_index(self):
+        if self.spatial_dirty:
+            self.spatial.rebuild(self.entities)
+            self.spatial_dirty = False
+        elif self.moved:
+            for entity in self.moved:
+                self.spatial.move(entity)
+        self.moved.clear()
+        return self.spatial
+
+_world = World()
+_sounds = {}
+
+def new_world():
+    # Start again from an empty game; assets such as sounds are kept
+    global _world
+    _world = World()
+    _scenes.reset()
+    Game.frame_count = 0
+    return _world
+
+def get_world():
+    return _world
+
+def set_score(score):
+    _world.score = score
+
+def get_score():
+    return _world.score
 
 # -------------------------------------------------------------------
 # Input functions exposed to students
 # -------------------------------------------------------------------
 
 def get_mouse_motion():
-    return _input.mouse_motion
+    return _world.input.mouse_motion
 
 def is_key_pressed(key_name):
-    return _input.is_key_pressed(key_name, Game.frame_count)
+    return _world.input.is_key_pressed(key_name, _world.frame_count)
 
 def is_key_held(key_name):
-    return _input.is_key_held(key_name)
+    return _world.input.is_key_held(key_name)
 
 def set_key_cooldown(key_name, frames):
-    _input.set_key_cooldown(key_name, frames)
+    _world.input.set_key_cooldown(key_name, frames)
 
 def is_mouse_pressed(button):
-    return _input.is_mouse_pressed(button)
+    return _world.input.is_mouse_pressed(button)
 
 def is_mouse_held(button):
-    return _input.is_mouse_held(button)
+    return _world.input.is_mouse_held(button)
 
 def is_mouse_released(button):
-    return _input.is_mouse_released(button)
+    return _world.input.is_mouse_released(button)
 
 def get_mouse_position():
-    return _input.get_mouse_position()
+    return _world.input.get_mouse_position()
 
 # -------------------------------------------------------------------
-# Internal data store for entities and game state
+# Simulated input, for headless games driven by a program
 # -------------------------------------------------------------------
 
-_entities = []
-_entity_behaviors = []
-_sounds = {}
-_game_over = False
-_end_message = None
+def press_key(key_name):
+    key = _key_code(key_name)
+    if key is not None:
+        _world.input.queue_event(pygame.KEYDOWN, key=key)
+
+def release_key(key_name):
+    key = _key_code(key_name)
+    if key is not None:
+        _world.input.queue_event(pygame.KEYUP, key=key)
+
+def press_mouse(button):
+    _world.input.queue_event(pygame.MOUSEBUTTONDOWN, button=button, pos=_world.input.mouse_position)
+
+def release_mouse(button):
+    _world.input.queue_event(pygame.MOUSEBUTTONUP, button=button, pos=_world.input.mouse_position)
+
+def move_mouse(x, y):
+    _world.input.queue_event(pygame.MOUSEMOTION, pos=(x, y))
 
 # -------------------------------------------------------------------
 # Entity system
 # -------------------------------------------------------------------
 
 class Entity:
+    # Slots keep each entity small; __dict__ is still there (created only
+    # when first used) so games can add their own attributes. x, y, width
+    # and height are properties over _x, _y, _width and _height (set up
+    # below the class) so that moving an entity by hand is noticed.
+    __slots__ = ("_x", "_y", "_width", "_height", "color", "dx", "dy", "alive",
+                 "continuous", "prev_x", "prev_y", "group", "image", "angle", "_rect",
+                 "__dict__", "__weakref__")
+
     def is_touching_mouse(self):
-        mx, my = get_mouse_position()
+        mx, my = screen_to_world(*get_mouse_position())
         return self.x <= mx <= self.x + self.width and self.y <= my <= self.y + self.height
 
-    def __init__(self, x, y, width=50, height=50, color=(255, 0, 0), dx=0, dy=0):
-        self.x = x
-        self.y = y
-        self.width = width
-        self.height = height
+    @property
+    def rect(self):
+        # The smallest whole-pixel pygame.Rect covering the entity, rebuilt
+        # only after it has moved or changed size. Treat it as read-only.
+        rect = self._rect
+        if rect is None:
+            rect = self._rect = _cover_rect(self._x, self._y, self._width, self._height)
+        return rect
+
+    def __init__(self, x, y, width=None, height=None, color=(255, 0, 0), dx=0, dy=0, continuous=False, group=None,
+                 image=None, angle=0):
+        # Image entities default to the image's own size
+        if image is not None and (width is None or height is None):
+            image_width, image_height = _assets.get(image).get_size()
+            width = image_width if width is None else width
+            height = image_height if height is None else height
+        self._x = x
+        self._y = y
+        self._width = 50 if width is None else width
+        self._height = 50 if height is None else height
         self.color = color
         self.dx = dx
         self.dy = dy
         self.alive = True
+        # Continuous entities remember where update() moved them from, and
+        # is_touching() checks the whole path so fast movers can't tunnel
+        self.continuous = continuous
+        self.prev_x = x
+        self.prev_y = y
+        self.group = group
+        self.image = image
+        self.angle = angle
+        self._rect = None
 
     def update(self):
-        self.x += self.dx
-        self.y += self.dy
+        # Moves through the slots: the grid is rebuilt after every update
+        if self.continuous:
+            self.prev_x = self._x
+            self.prev_y = self._y
+        self._x += self.dx
+        self._y += self.dy
+        self._rect = None
 
-        screen = pygame.display.get_surface()
-        screen_width, screen_height = screen.get_size()
+        world_width, world_height = _world.bounds
 
-        if self.y < -self.height or self.y > screen_height or self.x < -self.width or self.x > screen_width:
+        if self._y < -self._height or self._y > world_height or self._x < -self._width or self._x > world_width:
             self.alive = False
 
     def draw(self, screen):
-        pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
+        if self.image is not None:
+            surface, offset_x, offset_y = _assets.variant(self.image, int(self._width), int(self._height), self.angle)
+            screen.blit(surface, (self._x + offset_x, self._y + offset_y))
+        else:
+            pygame.draw.rect(screen, self.color, (self._x, self._y, self._width, self._height))
 
     def is_touching(self, other_entity):
+        if self.continuous:
+            return _sweep_time(self, other_entity) is not None
+        if other_entity.continuous:
+            return _sweep_time(other_entity, self) is not None
         return (
-            self.x < other_entity.x + other_entity.width and
-            self.x + self.width > other_entity.x and
-            self.y < other_entity.y + other_entity.height and
-            self.y + self.height > other_entity.y
+            self._x < other_entity._x + other_entity._width and
+            self._x + self._width > other_entity._x and
+            self._y < other_entity._y + other_entity._height and
+            self._y + self._height > other_entity._y
         )
 
+    def sweep_against(self, others):
+        # Earliest hit along the path of the last update: (time, entity),
+        # where time runs from 0 (previous position) to 1 (current), or None
+        best = None
+        for other in others:
+            if other is self or not other.alive:
+                continue
+            hit_time = _sweep_time(self, other)
+            if hit_time is not None and (best is None or hit_time < best[0]):
+                best = (hit_time, other)
+        return best
+
+def _geometry_field(name):
+    # Reads go straight to the slot; writes also drop the cached rect and
+    # tell the grid this entity needs filing again
+    slot = getattr(Entity, "_" + name)
+    set_slot = slot.__set__
+
+    def set_value(entity, value):
+        set_slot(entity, value)
+        entity._rect = None
+        _world.moved_by_hand(entity)
+    return property(slot.__get__, set_value)
+
+for _name in ("x", "y", "width", "height"):
+    setattr(Entity, _name, _geometry_field(_name))
+del _name
+
+def _sweep_time(mover, target):
+    # Swept AABB test of mover going from (prev_x, prev_y) to (x, y)
+    # against target where it is now, or, when the target is continuous
+    # too, against its previous position with the motion made relative
+    if target.continuous:
+        axes = ((mover.prev_x, mover._width, mover._x - target._x + target.prev_x, target.prev_x, target._width),
+                (mover.prev_y, mover._height, mover._y - target._y + target.prev_y, target.prev_y, target._height))
+    else:
+        axes = ((mover.prev_x, mover._width, mover._x, target._x, target._width),
+                (mover.prev_y, mover._height, mover._y, target._y, target._height))
+    enter, leave = 0.0, 1.0
+    for start, size, end, target_start, target_size in axes:
+        move = end - start
+        if move == 0:
+            if start + size <= target_start or start >= target_start + target_size:
+                return None
+            continue
+        first = (target_start - (start + size)) / move
+        last = (target_start + target_size - start) / move
+        if first > last:
+            first, last = last, first
+        enter = max(enter, first)
+        leave = min(leave, last)
+        if enter >= leave:
+            return None
+    return enter
+
+def _cover_rect(x, y, width, height):
+    # Edges rounded outwards, so any overlap of the float boxes is also an
+    # overlap of the rects (at least a pixel wide: pygame ignores empty ones)
+    left = math.floor(x)
+    top = math.floor(y)
+    return pygame.Rect(left, top, max(math.ceil(x + width) - left, 1), max(math.ceil(y + height) - top, 1))
+
+def _bounds(entity):
+    # The area an entity covered this frame: its whole path if continuous
+    if entity.continuous:
+        left = min(entity._x, entity.prev_x)
+        top = min(entity._y, entity.prev_y)
+        return (left, top,
+                max(entity._x, entity.prev_x) - left + entity._width,
+                max(entity._y, entity.prev_y) - top + entity._height)
+    return entity._x, entity._y, entity._width, entity._height
+
+# -------------------------------------------------------------------
+# Background asset loading
+# load_sound, load_image, load_sprite_sheet and preload_font hand the
+# decoding to worker threads and return at once. Game.start shows a
+# loading screen until they finish; anything used before then is
+# waited for (or, in a forked process, loaded) on first use.
+# -------------------------------------------------------------------
+
+class Preloader:
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.executor = None
+        self.jobs = {}  # (kind, name) -> (function, args)
+        self.futures = {}  # (kind, name) -> Future
+        self.pid = os.getpid()
+        self.on_progress = None
+
+    def submit(self, kind, name, function, *args):
+        if self.executor is None or self.pid != os.getpid():
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="pynovi-loader")
+            self.pid = os.getpid()
+        self.jobs[(kind, name)] = (function, args)
+        self.futures[(kind, name)] = self.executor.submit(function, *args)
+
+    def result(self, kind, name):
+        key = (kind, name)
+        future = self.futures.get(key)
+        if future is None:
+            return None
+        if not future.done() and self.pid != os.getpid():
+            # Forked while loading: the worker thread didn't come with us
+            function, args = self.jobs[key]
+            return function(*args)
+        return future.result()
+
+    def progress(self):
+        done = sum(1 for future in self.futures.values() if future.done())
+        return done, len(self.futures)
+
+    def busy(self):
+        done, total = self.progress()
+        return done < total
+
+_preloader = Preloader()
+
+def preload_font(size):
+    _init_font()
+    _preloader.submit("font", size, pygame.font.Font, None, size)
+
+def preload_assets(manifest, on_progress=None):
+    # manifest: {"sounds": {name: path}, "images": [path, ...],
+    #            "sprite_sheets": {name: (path, frame_width, frame_height)},
+    #            "fonts": [size, ...]}
+    for name, path in manifest.get("sounds", {}).items():
+        load_sound(name, path)
+    for path in manifest.get("images", ()):
+        load_image(path)
+    for name, (path, frame_width, frame_height) in manifest.get("sprite_sheets", {}).items():
+        load_sprite_sheet(name, path, frame_width, frame_height)
+    for size in manifest.get("fonts", ()):
+        preload_font(size)
+    if on_progress is not None:
+        set_loading_callback(on_progress)
+
+def set_loading_callback(callback):
+    # callback(done, total) is called by the loading screen as assets finish
+    _preloader.on_progress = callback
+
+def get_loading_progress():
+    return _preloader.progress()
+
+# -------------------------------------------------------------------
+# Image assets
+# Each file is loaded once and converted to the display's pixel format
+# the first time it is drawn (converting needs a display). Scaled and
+# rotated versions are cached too, so nothing is transformed per frame.
+# Sprite sheets are cut into frames named "sheet:0", "sheet:1", ...
+# -------------------------------------------------------------------
+
+class AssetCache:
+    # Scaled and rotated variants are kept in an LRU bounded by their total
+    # pixel memory, like rendered text
+    def __init__(self, max_variant_bytes=32 * 1024 * 1024):
+        self.loaded = {}  # path -> surface as loaded from disk
+        self.converted = {}  # image name -> surface in display format
+        self.variants = OrderedDict()  # (image name, width, height, angle) -> (surface, offset x, offset y)
+        self.variant_bytes = 0
+        self.max_variant_bytes = max_variant_bytes
+        self.sheets = {}  # sheet name -> (path, frame width, frame height)
+
+    def load(self, path):
+        surface = self.loaded.get(path)
+        if surface is None:
+            surface = _preloader.result("image", path)
+            if surface is None:
+                surface = pygame.image.load(path)
+            self.loaded[path] = surface
+        return surface
+
+    def add_sprite_sheet(self, name, path, frame_width, frame_height):
+        self.sheets[name] = (path, frame_width, frame_height)
+
+    def _source(self, name):
+        sheet_name, _, frame = name.rpartition(":")
+        if sheet_name in self.sheets:
+            path, frame_width, frame_height = self.sheets[sheet_name]
+            sheet = self.load(path)
+            columns = sheet.get_width() // frame_width
+            index = int(frame)
+            area = ((index % columns) * frame_width, (index // columns) * frame_height, frame_width, frame_height)
+            return sheet.subsurface(area)
+        return self.load(name)
+
+    def get(self, name):
+        surface = self.converted.get(name)
+        if surface is not None:
+            return surface
+        surface = self._source(name)
+        if pygame.display.get_surface() is None:
+            return surface  # no display yet: convert later
+        if surface.get_flags() & pygame.SRCALPHA or surface.get_colorkey() is not None:
+            surface = surface.convert_alpha()
+        else:
+            surface = surface.convert()
+        self.converted[name] = surface
+        return surface
+
+    def variant(self, name, width, height, angle=0):
+        # Whole degrees: a smoothly turning sprite reuses 360 rotations
+        # instead of caching one per float angle
+        angle = round(angle) % 360
+        key = (name, width, height, angle)
+        found = self.variants.get(key)
+        if found is not None:
+            self.variants.move_to_end(key)
+        else:
+            surface = self.get(name)
+            if surface.get_size() != (width, height):
+                size = (max(width, 0), max(height, 0))
+                try:
+                    surface = pygame.transform.smoothscale(surface, size)
+                except ValueError:  # smoothscale needs 24 or 32 bit pixels
+                    surface = pygame.transform.scale(surface, size)
+            offset_x = offset_y = 0
+            if angle:
+                # Rotate about the centre of the entity's rectangle
+                surface = pygame.transform.rotate(surface, angle)
+                offset_x = (width - surface.get_width()) / 2
+                offset_y = (height - surface.get_height()) / 2
+            found = (surface, offset_x, offset_y)
+            if name in self.converted:
+                self.variants[key] = found
+                self.variant_bytes += surface.get_pitch() * surface.get_height()
+                # Always keep the newest variant, even if it alone is over the limit
+                while self.variant_bytes > self.max_variant_bytes and len(self.variants) > 1:
+                    _, (old, _, _) = self.variants.popitem(last=False)
+                    self.variant_bytes -= old.get_pitch() * old.get_height()
+        return found
+
+_assets = AssetCache()
+
+def load_image(path):
+    if path not in _assets.loaded and ("image", path) not in _preloader.futures:
+        _preloader.submit("image", path, pygame.image.load, path)
+
+def load_sprite_sheet(name, path, frame_width, frame_height):
+    _assets.add_sprite_sheet(name, path, frame_width, frame_height)
+    load_image(path)
+
+# -------------------------------------------------------------------
+# Batched rendering
+# Plain rectangle entities are blitted from a pre-filled tile per
+# (color, size), and images from a cached variant, all in one blits()
+# call. The list keeps the entities' order, so overlapping entities stack
+# as if each drew itself: later ones on top. An entity with its own
+# draw() flushes the list and draws in its place. (The array backend
+# still draws by look, so its overlaps may stack in any order.)
+# -------------------------------------------------------------------
+
+_tiles = {}
+_plain_draw = {}
+_entity_draw = Entity.draw
+
+def _get_tile(color, width, height):
+    key = (color, width, height)
+    tile = _tiles.get(key)
+    if tile is None:
+        tile = _tiles[key] = pygame.Surface((width, height))
+        tile.fill(color)
+    return tile
+
+def _blit_batch(screen, blit_list):
+    if hasattr(screen, "fblits"):
+        screen.fblits(blit_list)
+    else:
+        screen.blits(blit_list, doreturn=False)
+
+def _draw_at_offset(screen, entity, offset):
+    # draw() works in screen coordinates, so move the entity there and back
+    if offset == (0, 0):
+        entity.draw(screen)
+        return
+    # (through the slots, so the grid is not told about it)
+    x, y = entity._x, entity._y
+    entity._x, entity._y = x + offset[0], y + offset[1]
+    entity._rect = None
+    try:
+        entity.draw(screen)
+    finally:
+        entity._x, entity._y = x, y
+        entity._rect = None
+
+def _draw_entities(screen, entities, previous=None, alpha=1.0, offset=(0, 0)):
+    looks = {}  # (color, width, height) or (image, width, height, angle) -> (surface, offset x, offset y)
+    blit_list = []
+    offset_x, offset_y = offset
+    for entity in entities:
+        cls = type(entity)
+        plain = _plain_draw.get(cls)
+        if plain is None:
+            plain = _plain_draw[cls] = cls.draw is Entity.draw
+        # draw() can also be replaced on one entity; checked through the
+        # bound method so entities without custom attributes get no __dict__
+        if not plain or getattr(entity.draw, "__func__", None) is not _entity_draw:
+            # Draw what is queued first, so this one lands on top of it
+            if blit_list:
+                _blit_batch(screen, blit_list)
+                blit_list = []
+            _draw_at_offset(screen, entity, offset)
+            continue
+        width, height = int(entity._width), int(entity._height)
+        if entity.image is None:
+            color = entity.color
+            key = (color if type(color) is tuple else tuple(pygame.Color(color)), width, height)
+            look = looks.get(key)
+            if look is None:
+                tile = _get_tile(key[0], width, height) if width > 0 and height > 0 else None
+                look = looks[key] = (tile, 0, 0)
+        else:
+            key = (entity.image, width, height, entity.angle)
+            look = looks.get(key)
+            if look is None:
+                look = looks[key] = _assets.variant(*key)
+        surface, look_x, look_y = look
+        if surface is None:
+            continue
+        x, y = entity._x, entity._y
+        if previous is not None:
+            old = previous.get(entity)
+            if old is not None:
+                x = old[0] + (x - old[0]) * alpha
+                y = old[1] + (y - old[1]) * alpha
+        blit_list.append((surface, (x + offset_x + look_x, y + offset_y + look_y)))
+    if blit_list:
+        _blit_batch(screen, blit_list)
+
+# -------------------------------------------------------------------
+# Array backend (optional, needs NumPy)
+# Entity data lives in contiguous arrays so movement and culling for
+# every entity is one vectorized pass instead of a Python loop.
+# -------------------------------------------------------------------
+
+class EntityStore:
+    FIELDS = ("x", "y", "width", "height", "dx", "dy")
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.size = 0  # high-water mark of used slots
+        self.free = []
+        for name in self.FIELDS:
+            setattr(self, name, np.zeros(capacity))
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.used = np.zeros(capacity, dtype=bool)
+        self.color_id = np.zeros(capacity, dtype=np.int32)
+        self.owners = [None] * capacity
+        self.colors = []
+        self.palette = {}
+
+    def _grow(self):
+        extra = self.capacity
+        for name in self.FIELDS:
+            setattr(self, name, np.concatenate((getattr(self, name), np.zeros(extra))))
+        self.alive = np.concatenate((self.alive, np.zeros(extra, dtype=bool)))
+        self.used = np.concatenate((self.used, np.zeros(extra, dtype=bool)))
+        self.color_id = np.concatenate((self.color_id, np.zeros(extra, dtype=np.int32)))
+        self.owners.extend([None] * extra)
+        self.capacity += extra
+
+    def allocate(self, entity):
+        if self.free:
+            index = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow()
+            index = self.size
+            self.size += 1
+        self.owners[index] = entity
+        self.used[index] = True
+        self.alive[index] = True
+        return index
+
+    def color_index(self, color):
+        if type(color) is not tuple:
+            color = tuple(pygame.Color(color))  # names like "red" and lists
+        index = self.palette.get(color)
+        if index is None:
+            index = self.palette[color] = len(self.colors)
+            self.colors.append(color)
+        return index
+
+    def release(self, index):
+        self.owners[index] = None
+        self.used[index] = False
+        self.alive[index] = False
+        self.free.append(index)
+
+    def step(self, screen_width, screen_height):
+        n = self.size
+        x, y = self.x[:n], self.y[:n]
+        width, height = self.width[:n], self.height[:n]
+        x += self.dx[:n]
+        y += self.dy[:n]
+        offscreen = (y < -height) | (y > screen_height) | (x < -width) | (x > screen_width)
+        self.alive[:n] &= ~offscreen
+
+    def collect(self):
+        # Detach dead entities from their slots and return them
+        n = self.size
+        dead = np.flatnonzero(self.used[:n] & ~self.alive[:n]).tolist()
+        owners = self.owners
+        entities = [owners[index] for index in dead]
+        for index, entity in zip(dead, entities):
+            entity._detach()
+            self.release(index)
+        return entities
+
+    def draw(self, screen, previous=None, alpha=1.0, offset=(0, 0), view=None):
+        # Batch by (color, width, height) using the arrays directly. With a
+        # view (x, y, width, height) only entities overlapping it are drawn.
+        n = self.size
+        x, y = self.x[:n], self.y[:n]
+        if previous is not None:
+            # Slots allocated since the previous step have no old position
+            old_x, old_y = previous
+            count = len(old_x)
+            x, y = x.copy(), y.copy()
+            x[:count] = old_x + (x[:count] - old_x) * alpha
+            y[:count] = old_y + (y[:count] - old_y) * alpha
+        shown = self.alive[:n]
+        if view is not None:
+            left, top, width, height = view
+            shown = shown & (x < left + width) & (x + self.width[:n] > left) & (y < top + height) & (y + self.height[:n] > top)
+        index = np.flatnonzero(shown)
+        if not len(index):
+            return
+        widths = np.maximum(self.width[index], 0).astype(np.int64)
+        heights = np.maximum(self.height[index], 0).astype(np.int64)
+        keys = (self.color_id[index].astype(np.int64) << 40) | ((widths & 0xFFFFF) << 20) | (heights & 0xFFFFF)
+        groups, inverse = np.unique(keys, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(groups) + 1)).tolist()
+        xs = (x[index][order] + offset[0]).tolist()
+        ys = (y[index][order] + offset[1]).tolist()
+        for group, key in enumerate(groups.tolist()):
+            color_id, width, height = key >> 40, (key >> 20) & 0xFFFFF, key & 0xFFFFF
+            if width <= 0 or height <= 0:
+                continue
+            tile = _get_tile(self.colors[color_id], width, height)
+            start, end = bounds[group], bounds[group + 1]
+            _blit_batch(screen, [(tile, position) for position in zip(xs[start:end], ys[start:end])])
+
+def _array_field(name, moves=False):
+    # moves: writes tell the grid, like Entity's x/y/width/height
+    def get(self):
+        if self._index < 0:
+            return self._detached[name]
+        return getattr(self._store, name)[self._index].item()
+
+    def set(self, value):
+        if self._index < 0:
+            self._detached[name] = value
+        else:
+            getattr(self._store, name)[self._index] = value
+        if moves:
+            _world.moved_by_hand(self)
+
+    return property(get, set)
+
+class ArrayEntity(Entity):
+    # A thin view onto one slot of an EntityStore. Once dead it keeps a
+    # copy of its last values, so old references stay safe to read.
+    __slots__ = ("_store", "_index", "_detached")
+
+    x = _array_field("x", moves=True)
+    y = _array_field("y", moves=True)
+    width = _array_field("width", moves=True)
+    height = _array_field("height", moves=True)
+    _x = _array_field("x")
+    _y = _array_field("y")
+    _width = _array_field("width")
+    _height = _array_field("height")
+    dx = _array_field("dx")
+    dy = _array_field("dy")
+    alive = _array_field("alive")
+
+    @property
+    def color(self):
+        if self._index < 0:
+            return self._detached["color"]
+        return self._store.colors[self._store.color_id[self._index]]
+
+    @color.setter
+    def color(self, value):
+        if self._index < 0:
+            self._detached["color"] = value
+        else:
+            self._store.color_id[self._index] = self._store.color_index(value)
+
+    @property
+    def rect(self):
+        return _cover_rect(self._x, self._y, self._width, self._height)  # the store moves it without telling us
+
+    def __init__(self, store, x, y, width=50, height=50, color=(255, 0, 0), dx=0, dy=0, group=None):
+        self._store = store
+        self._index = store.allocate(self)
+        super().__init__(x, y, width, height, color, dx, dy, group=group)
+
+    def _detach(self):
+        store, index = self._store, self._index
+        self._detached = {name: getattr(store, name)[index].item() for name in EntityStore.FIELDS}
+        self._detached["alive"] = False
+        self._detached["color"] = store.colors[store.color_id[index]]
+        self._index = -1
+
+    def update(self):
+        pass  # the store moves and culls every entity at once
+
+def use_array_backend(capacity=1024):
+    if np is None:
+        raise ImportError("The array backend needs NumPy: pip install numpy")
+    if _world.entities:
+        raise RuntimeError("use_array_backend() must be called before any entities are created.")
+    _world.store = EntityStore(capacity)
+
+# -------------------------------------------------------------------
+# Entity pool
+# Dead entities are kept and re-initialised by create_entity instead of
+# allocating new ones. Only safe if the game drops its own references
+# to entities once they are dead, so it is off unless asked for.
+# Re-initialising resets every Entity attribute but not ones the game
+# added itself (clearing those would give each entity a __dict__), so
+# a pooling game sets its own attributes again after create_entity().
+# -------------------------------------------------------------------
+
+class EntityPool:
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.free = []
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+
+    def acquire(self, **kwargs):
+        if self.free:
+            entity = self.free.pop()
+            entity.__init__(**kwargs)
+            self.reused += 1
+        else:
+            entity = Entity(**kwargs)
+            self.created += 1
+        return entity
+
+    def release(self, entities):
+        room = self.max_size - len(self.free)
+        if room > 0:
+            recycled = [entity for entity in entities[:room] if type(entity) is Entity]
+            self.free.extend(recycled)
+            self.released += len(recycled)
+
+def set_entity_pooling(enabled=True, max_size=10000):
+    _world.pool = EntityPool(max_size) if enabled else None
+
+def get_pool_stats():
+    pool = _world.pool
+    if pool is None:
+        return None
+    acquired = pool.created + pool.reused
+    return {
+        "pooled": len(pool.free),
+        "created": pool.created,
+        "reused": pool.reused,
+        "released": pool.released,
+        "reuse_rate": pool.reused / acquired if acquired else 0.0,
+    }
+
 # -------------------------------------------------------------------
 # Entity API
 # -------------------------------------------------------------------
 
 def create_entity(**kwargs):
-    entity = Entity(**kwargs)
-    _entities.append(entity)
+    if _world.store is not None:
+        unsupported = [name for name in ("continuous", "image", "angle") if kwargs.get(name)]
+        if unsupported:
+            raise TypeError(f"The array backend (use_array_backend) does not support {', '.join(unsupported)}; "
+                            "plain rectangles only")
+        entity = ArrayEntity(_world.store, **{name: value for name, value in kwargs.items()
+                                              if name not in ("continuous", "image", "angle")})
+    elif _world.pool is not None:
+        entity = _world.pool.acquire(**kwargs)
+    else:
+        entity = Entity(**kwargs)
+    _world.add(entity)
+    if not _world.spatial_dirty:
+        _world.spatial.insert(entity)
     return entity
 
 def destroy(entity):
     entity.alive = False
+    _world.deaths = True
 
 def get_all():
-    return [entity for entity in _entities if entity.alive]
+    return [entity for entity in _world.entities if entity.alive]
+
+def get_group(name):
+    # The group's own list, not a copy: don't change it. Entities destroyed
+    # during this frame stay in it until the frame ends, so check .alive.
+    return _world.groups.get(name, ())
+
+def count_group(name):
+    return sum(1 for entity in _world.groups.get(name, ()) if entity.alive)
+
+def set_group(entity, name):
+    old = _world.groups.get(entity.group)
+    if old is not None and entity in old:
+        old.remove(entity)
+    entity.group = name
+    if name is not None and entity.alive:
+        _world.groups.setdefault(name, []).append(entity)
+
+def get_touching(entity):
+    # Entities touching this one, checking only those in nearby grid cells
+    candidates = _world.spatial_index().query(*_bounds(entity))
+    return [other for other in candidates
+            if other is not entity and other.alive and entity.is_touching(other)]
+
+def _touch_candidates(entity, candidates):
+    if candidates is None:
+        candidates = _world.spatial_index().query(*_bounds(entity))
+    others = candidates if isinstance(candidates, list) else list(candidates)
+    # Rects that cover each entity (its whole path if continuous), so
+    # pygame finds every candidate; hits are then checked exactly
+    rects = [_cover_rect(*_bounds(other)) if other.continuous else other.rect for other in others]
+    return others, rects
+
+def _touching_exact(entity, others):
+    return [other for other in others if other is not entity and other.alive and entity.is_touching(other)]
+
+def _confirmed(entity, other):
+    return other is not entity and other.alive and entity.is_touching(other)
+
+def all_touching(entity, candidates=None):
+    # Like get_touching, but the broad overlap tests run in pygame on
+    # whole-pixel rects. Without candidates, nearby entities from the grid
+    # are used.
+    if entity.continuous:
+        return get_touching(entity) if candidates is None else _touching_exact(entity, candidates)
+    others, rects = _touch_candidates(entity, candidates)
+    return [others[i] for i in entity.rect.collidelistall(rects) if _confirmed(entity, others[i])]
+
+def first_touching(entity, candidates=None):
+    # The first of candidates touching entity, or None
+    if entity.continuous:
+        touching = all_touching(entity, candidates)
+        return touching[0] if touching else None
+    others, rects = _touch_candidates(entity, candidates)
+    index = entity.rect.collidelist(rects)
+    if index < 0:
+        return None
+    if _confirmed(entity, others[index]):
+        return others[index]
+    for index in entity.rect.collidelistall(rects):
+        if _confirmed(entity, others[index]):
+            return others[index]
+    return None
+
+def touching_map(entities, candidates):
+    # {entity: [candidates it touches]} for every entity touching any. The
+    # candidate rects are built once, so this is much cheaper than calling
+    # all_touching for each entity against the same large list.
+    others, rects = _touch_candidates(None, candidates)
+    touching = {}
+    for entity in entities:
+        if not entity.alive:
+            continue
+        if entity.continuous:
+            hits = _touching_exact(entity, others)
+        else:
+            hits = [others[i] for i in entity.rect.collidelistall(rects) if _confirmed(entity, others[i])]
+        if hits:
+            touching[entity] = hits
+    return touching
+
+def get_entities_in_rect(x, y, width, height):
+    candidates = _world.spatial_index().query(x, y, width, height)
+    return [entity for entity in candidates
+            if entity.alive and
+            entity._x < x + width and entity._x + entity._width > x and
+            entity._y < y + height and entity._y + entity._height > y]
+
+def set_collision_cell_size(size):
+    _world.spatial.cell_size = size
+    _world.spatial_dirty = True
 
 def on_update(update_function):
-    _entity_behaviors.append(update_function)
+    _world.behaviors.append(update_function)
+
+# -------------------------------------------------------------------
+# Collision callbacks
+# Game checks every registered pair of groups once per frame, after
+# entities have moved, and calls handler(entity_a, entity_b) when two
+# start touching ("enter"), every frame they touch ("stay") or when
+# they stop touching or one of them dies ("exit").
+# -------------------------------------------------------------------
+
+def on_collision(group_a, group_b, handler, when="enter"):
+    if when not in ("enter", "stay", "exit"):
+        raise ValueError("when must be 'enter', 'stay' or 'exit'.")
+    _world.collision_rules.append((group_a, group_b, handler, when))
+
+def _touching_pairs(members, index, group_a, group_b):
+    pairs = set()
+    for entity in members.get(group_a, ()):
+        for other in index.query(*_bounds(entity)):
+            if other.group != group_b or other is entity or not entity.is_touching(other):
+                continue
+            if group_a == group_b and id(other) < id(entity):
+                continue  # each pair once within a single group
+            pairs.add((entity, other))
+    return pairs
+
+def _resolve_collisions(world):
+    rules = world.collision_rules
+    if not rules:
+        return
+
+    # One broadphase grid holding just the entities in watched groups
+    groups = {rule[0] for rule in rules} | {rule[1] for rule in rules}
+    members = world.groups
+    index = SpatialHash(world.spatial.cell_size)
+    for group in groups:
+        for entity in members.get(group, ()):
+            index.insert(entity)
+
+    current = {}
+    for group_a, group_b, _, _ in rules:
+        key = (group_a, group_b)
+        if key in current:
+            continue
+        if (group_b, group_a) in current:
+            current[key] = {(a, b) for b, a in current[(group_b, group_a)]}
+        else:
+            current[key] = _touching_pairs(members, index, group_a, group_b)
+
+    previous = world.contacts
+    world.contacts = current
+    for group_a, group_b, handler, when in rules:
+        now = current[(group_a, group_b)]
+        before = previous.get((group_a, group_b), set())
+        if when == "enter":
+            pairs = now - before
+        elif when == "stay":
+            pairs = now & before
+        else:
+            pairs = before - now
+        for entity_a, entity_b in pairs:
+            handler(entity_a, entity_b)
+
+# -------------------------------------------------------------------
+# Tilemaps
+# A static grid of tiles loaded from a text or CSV file. Tiles are drawn
+# into chunk surfaces once and each visible chunk is a single blit;
+# solid tiles are found by indexing the grid, not by searching it.
+# -------------------------------------------------------------------
+
+_TILE_KEY = (255, 0, 255)
+
+class Tilemap:
+    def __init__(self, rows, tiles, tile_size=32, solid=None, chunk_size=16):
+        # rows: lists of symbols; tiles: symbol -> color or image name
+        width = max((len(row) for row in rows), default=0)
+        self.grid = [list(row) + [""] * (width - len(row)) for row in rows]
+        self.columns = width
+        self.rows = len(rows)
+        self.tiles = tiles
+        self.tile_size = tile_size
+        self.solid = set(tiles) if solid is None else set(solid)
+        self.chunk_size = chunk_size
+        self.chunks = {}  # (chunk column, chunk row) -> Surface
+        self.changed = []  # areas redrawn since the last dirty_rects frame
+
+    def tile(self, column, row):
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return self.grid[row][column]
+        return None
+
+    def tile_at(self, x, y):
+        return self.tile(math.floor(x / self.tile_size), math.floor(y / self.tile_size))
+
+    def set_tile(self, column, row, symbol):
+        self.grid[row][column] = symbol
+        self.chunks.pop((column // self.chunk_size, row // self.chunk_size), None)
+        size = self.tile_size
+        self.changed.append(pygame.Rect(column * size, row * size, size, size))
+
+    def solid_tiles_touching(self, x, y, width, height):
+        # (column, row) of every solid tile overlapping the area
+        size = self.tile_size
+        first_column = max(math.floor(x / size), 0)
+        last_column = min(math.ceil((x + width) / size), self.columns) - 1
+        first_row = max(math.floor(y / size), 0)
+        last_row = min(math.ceil((y + height) / size), self.rows) - 1
+        solid = self.solid
+        return [(column, row)
+                for row in range(first_row, last_row + 1)
+                for column, symbol in enumerate(self.grid[row][first_column:last_column + 1], first_column)
+                if symbol in solid]
+
+    def is_touching(self, entity):
+        return bool(self.solid_tiles_touching(*_bounds(entity)))
+
+    def _render_chunk(self, chunk_column, chunk_row):
+        size = self.tile_size
+        span = self.chunk_size
+        first_column = chunk_column * span
+        first_row = chunk_row * span
+        columns = min(span, self.columns - first_column)
+        rows = min(span, self.rows - first_row)
+        surface = pygame.Surface((columns * size, rows * size), pygame.SRCALPHA)
+        covered = True
+        images = False
+        for row in range(rows):
+            for column in range(columns):
+                tile = self.tiles.get(self.grid[first_row + row][first_column + column])
+                if tile is None:
+                    covered = False
+                elif isinstance(tile, str):
+                    image, offset_x, offset_y = _assets.variant(tile, size, size, 0)
+                    surface.blit(image, (column * size + offset_x, row * size + offset_y))
+                    images = True
+                else:
+                    surface.fill(tile, (column * size, row * size, size, size))
+        if pygame.display.get_surface() is None:
+            return surface
+        # Per-pixel alpha is the slowest to blit, so only images with gaps
+        # keep it; gaps between plain colors become an RLE colorkey
+        if covered:
+            return surface.convert()
+        if images:
+            return surface.convert_alpha()
+        keyed = pygame.Surface(surface.get_size())
+        keyed.fill(_TILE_KEY)
+        keyed.blit(surface, (0, 0))
+        keyed.set_colorkey(_TILE_KEY, pygame.RLEACCEL)
+        return keyed.convert()
+
+    def draw(self, screen, area=None, offset=(0, 0)):
+        # One blit per chunk overlapping area (in screen coordinates, the
+        # whole screen by default); offset takes world to screen coordinates
+        if area is None:
+            area = screen.get_rect()
+        area = area.move(-offset[0], -offset[1])
+        pixels = self.tile_size * self.chunk_size
+        chunk_columns = -(-self.columns // self.chunk_size)
+        chunk_rows = -(-self.rows // self.chunk_size)
+        blits = []
+        for chunk_row in range(max(area.top // pixels, 0), min((area.bottom - 1) // pixels + 1, chunk_rows)):
+            for chunk_column in range(max(area.left // pixels, 0), min((area.right - 1) // pixels + 1, chunk_columns)):
+                surface = self.chunks.get((chunk_column, chunk_row))
+                if surface is None:
+                    surface = self.chunks[(chunk_column, chunk_row)] = self._render_chunk(chunk_column, chunk_row)
+                position = (chunk_column * pixels, chunk_row * pixels)
+                visible = area.clip(surface.get_rect(topleft=position))
+                blits.append((surface, visible.move(offset).topleft, visible.move(-position[0], -position[1])))
+        screen.blits(blits, doreturn=False)
+
+def _read_tile_rows(path):
+    with open(path, newline="") as file:
+        if path.lower().endswith(".csv"):
+            return [[cell.strip() for cell in row] for row in csv.reader(file)]
+        return [list(line.rstrip("\r\n")) for line in file]
+
+def load_tilemap(path, tiles=None, tile_size=32, solid=None, chunk_size=16):
+    # Text files use one character per tile, CSV files one cell per tile.
+    # tiles maps each symbol to a color or an image name; other symbols
+    # are empty. Solid tiles are all drawn symbols unless solid says otherwise.
+    if tiles is None:
+        tiles = {"#": (128, 128, 128)}
+    _world.tilemap = Tilemap(_read_tile_rows(path), tiles, tile_size, solid, chunk_size)
+    return _world.tilemap
+
+def get_tilemap():
+    return _world.tilemap
+
+def get_tile_at(x, y):
+    return _world.tilemap.tile_at(x, y) if _world.tilemap is not None else None
+
+def set_tile(column, row, symbol):
+    _world.tilemap.set_tile(column, row, symbol)
+
+def is_touching_tiles(entity):
+    return _world.tilemap is not None and _world.tilemap.is_touching(entity)
+
+# -------------------------------------------------------------------
+# Camera
+# With a camera, entity positions are world coordinates in a world
+# that can be larger than the screen, and the screen shows the part
+# under the camera. Entities that wander out of view can keep
+# updating, be destroyed, or sleep: sleeping entities are filed in a
+# coarse grid and skip update() until the view comes near them again.
+# -------------------------------------------------------------------
+
+class Camera:
+    def __init__(self, world_width, world_height, offscreen="sleep", margin=64, cell_size=256):
+        if offscreen not in ("sleep", "destroy", "update"):
+            raise ValueError('offscreen must be "sleep", "destroy" or "update"')
+        self.x = 0
+        self.y = 0
+        self.world_width = world_width
+        self.world_height = world_height
+        self.offscreen = offscreen
+        self.margin = margin  # how far past the view entities stay awake
+        self.cell_size = cell_size
+        self.target = None
+        self.awake = []
+        self.asleep = {}  # entity -> cells it is filed under
+        self.cells = {}  # (cx, cy) -> set of sleeping entities
+
+    def view(self):
+        width, height = _world.screen_size
+        return int(self.x), int(self.y), width, height
+
+    def offset(self):
+        return -int(self.x), -int(self.y)
+
+    def move_to(self, x, y):
+        width, height = _world.screen_size
+        self.x = min(max(x, 0), max(self.world_width - width, 0))
+        self.y = min(max(y, 0), max(self.world_height - height, 0))
+
+    def add(self, entity):
+        if entity in self.asleep:
+            self._unfile(entity)  # a pooled entity reused while filed
+        self.awake.append(entity)
+
+    def _cell_keys(self, x, y, width, height):
+        size = self.cell_size
+        return [(cx, cy)
+                for cx in range(math.floor(x / size), math.floor((x + max(width, 0)) / size) + 1)
+                for cy in range(math.floor(y / size), math.floor((y + max(height, 0)) / size) + 1)]
+
+    def _unfile(self, entity):
+        for key in self.asleep.pop(entity):
+            bucket = self.cells[key]
+            bucket.discard(entity)
+            if not bucket:
+                del self.cells[key]
+
+    def _sleep(self, entity):
+        keys = self._cell_keys(entity._x, entity._y, entity._width, entity._height)
+        self.asleep[entity] = keys
+        for key in keys:
+            bucket = self.cells.get(key)
+            if bucket is None:
+                self.cells[key] = {entity}
+            else:
+                bucket.add(entity)
+
+    def step(self, world):
+        # After entities have moved: follow the target, then wake, sleep or
+        # destroy entities by whether they are near the view
+        if self.target is not None:
+            width, height = world.screen_size
+            self.move_to(self.target.x + self.target.width / 2 - width / 2,
+                         self.target.y + self.target.height / 2 - height / 2)
+        x, y, width, height = self.view()
+        left, top = x - self.margin, y - self.margin
+        right, bottom = x + width + self.margin, y + height + self.margin
+
+        if self.offscreen == "destroy":
+            for entity in world.entities:
+                if not (entity._x < right and entity._x + entity._width > left and
+                        entity._y < bottom and entity._y + entity._height > top):
+                    entity.alive = False
+            return
+        if self.offscreen != "sleep":
+            return
+
+        awake = []
+        for entity in self.awake:
+            if not entity.alive:
+                world.deaths = True
+                continue
+            if (entity._x < right and entity._x + entity._width > left and
+                    entity._y < bottom and entity._y + entity._height > top):
+                awake.append(entity)
+            else:
+                self._sleep(entity)
+        cells = self.cells
+        for key in self._cell_keys(left, top, right - left, bottom - top):
+            bucket = cells.get(key)
+            if not bucket:
+                continue
+            for entity in list(bucket):
+                if entity not in self.asleep:
+                    continue  # woken already from another cell
+                if not entity.alive:
+                    self._unfile(entity)
+                    world.deaths = True
+                elif (entity._x < right and entity._x + entity._width > left and
+                        entity._y < bottom and entity._y + entity._height > top):
+                    self._unfile(entity)
+                    awake.append(entity)
+        self.awake = awake
+
+    def visible(self, world):
+        # Entities overlapping the view
+        x, y, width, height = self.view()
+        if self.offscreen != "sleep":
+            # Called after the update phase, so this builds the grid from
+            # this frame's positions; it then serves every query until the
+            # next update
+            return get_entities_in_rect(x, y, width, height)
+        # Only entities near the view are awake: a pass over them is enough
+        return [entity for entity in self.awake
+                if entity.alive and entity._x < x + width and entity._x + entity._width > x and
+                entity._y < y + height and entity._y + entity._height > y]
+
+def set_camera(world_width, world_height, offscreen="sleep", margin=64):
+    # offscreen: "sleep" (stop updating), "destroy" or "update" entities
+    # more than margin pixels outside the view
+    camera = Camera(world_width, world_height, offscreen, margin)
+    if offscreen == "sleep":
+        camera.awake = list(_world.entities)
+    _world.camera = camera
+    _world.bounds = (world_width, world_height)
+    return camera
+
+def get_camera():
+    return _world.camera
+
+def move_camera(x, y):
+    _world.camera.move_to(x, y)
+
+def follow(entity):
+    # Keep entity in the middle of the view (None to stop following)
+    _world.camera.target = entity
+
+def screen_to_world(x, y):
+    camera = _world.camera
+    if camera is None:
+        return x, y
+    return x + int(camera.x), y + int(camera.y)
+
+def world_to_screen(x, y):
+    camera = _world.camera
+    if camera is None:
+        return x, y
+    return x - int(camera.x), y - int(camera.y)
+
+# -------------------------------------------------------------------
+# Scenes
+# Each scene is its own World, with its own entities, callbacks,
+# groups, camera and tilemap. Only the current scene is stepped:
+# switching away suspends a scene as it is and switching back resumes
+# it. Assets, input and the frame count are shared by all scenes.
+# -------------------------------------------------------------------
+
+def _swap_world(world):
+    global _world
+    previous = _world
+    _world = world
+    return previous
+
+class SceneManager:
+    def __init__(self, budget_ms=2.0):
+        self.setups = {}
+        self.worlds = {}  # name -> built World, current or suspended
+        self.building = {}  # name -> (World, generator) being preloaded
+        self.current = None
+        self.pending = None  # (name, restart) to switch to next frame
+        self.budget_ms = budget_ms  # preloading time allowed per frame
+
+    def reset(self):
+        self.worlds.clear()
+        self.building.clear()
+        self.current = None
+        self.pending = None
+
+    def preload(self, name):
+        # Run the scene's setup inside a new World. A setup written as a
+        # generator is only started here and continues a little each frame.
+        if name in self.worlds or name in self.building:
+            return
+        world = World()
+        world.input = _world.input
+        previous = _swap_world(world)
+        try:
+            steps = self.setups[name]()
+        finally:
+            _swap_world(previous)
+        if hasattr(steps, "__next__"):
+            self.building[name] = (world, steps)
+        else:
+            self.worlds[name] = world
+
+    def _advance(self, name, deadline=None):
+        world, steps = self.building[name]
+        previous = _swap_world(world)
+        try:
+            for _ in steps:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+        finally:
+            _swap_world(previous)
+        del self.building[name]
+        self.worlds[name] = world
+
+    def step(self):
+        # At the start of every frame: make a pending switch, then spend
+        # up to budget_ms on scenes being preloaded. True after a switch.
+        switched = self.pending is not None
+        if switched:
+            name, restart = self.pending
+            self.pending = None
+            if restart:
+                self.worlds.pop(name, None)
+                self.building.pop(name, None)
+            self.preload(name)
+            if name in self.building:
+                self._advance(name)  # needed now: finish it
+            world = self.worlds[name]
+            world.frame_count = _world.frame_count
+            world.screen_size = _world.screen_size
+            if world.camera is None:
+                world.bounds = _world.screen_size
+            _swap_world(world)
+            self.current = name
+        if self.building:
+            deadline = time.perf_counter() + self.budget_ms / 1000
+            for name in list(self.building):
+                self._advance(name, deadline)
+                if time.perf_counter() >= deadline:
+                    break
+        return switched
+
+_scenes = SceneManager()
+
+def add_scene(name, setup):
+    # setup() creates the scene's entities and callbacks as usual
+    _scenes.setups[name] = setup
+
+def switch_scene(name, restart=False):
+    # Takes effect at the start of the next frame. A suspended scene is
+    # resumed as it was left, unless restart is True.
+    _scenes.pending = (name, restart)
+
+def preload_scene(name):
+    _scenes.preload(name)
+
+def remove_scene(name):
+    # Forget a suspended scene; switching to it again builds it afresh
+    _scenes.worlds.pop(name, None)
+    _scenes.building.pop(name, None)
+
+def get_scene():
+    return _scenes.current
 
 # -------------------------------------------------------------------
 # Sound and text
 # -------------------------------------------------------------------
 
-def load_sound(name, path):
-    _sounds[name] = pygame.mixer.Sound(path)
+def load_sound(name, path, max_voices=None, priority=0, cooldown=0, reserved=False):
+    _init_mixer()
+    _sounds.pop(name, None)
+    _preloader.submit("sound", name, pygame.mixer.Sound, path)
+    configure_sound(name, max_voices, priority, cooldown, reserved)
+
+def _get_sound(name):
+    sound = _sounds.get(name)
+    if sound is None:
+        sound = _preloader.result("sound", name)
+        if sound is not None:
+            _sounds[name] = sound
+    return sound
+
+class SoundManager:
+    # Chooses a mixer channel for each play_sound call:
+    #   max_voices - at most this many copies of the sound at once; a new
+    #                play restarts the oldest copy
+    #   priority   - when every channel is busy, a sound may take over a
+    #                channel playing something of lower priority
+    #   cooldown   - ignore plays less than this many frames apart
+    #   reserved   - play only on the channels kept aside by
+    #                set_sound_channels(reserved=...)
+    def __init__(self):
+        self.settings = {}
+        self.playing = {}  # channel id -> (sound name, priority, frame started)
+        self.last_played = {}
+        self.reserved = 0
+        self.stats = {"played": 0, "dropped": 0, "stolen": 0, "cooldown": 0}
+
+    def _busy(self, channel_id, name):
+        info = self.playing.get(channel_id)
+        if info is None or (name is not None and info[0] != name):
+            return False
+        if pygame.mixer.Channel(channel_id).get_busy():
+            return True
+        del self.playing[channel_id]
+        return False
+
+    def _free_channel(self, reserved):
+        channels = range(self.reserved) if reserved else range(self.reserved, pygame.mixer.get_num_channels())
+        for channel_id in channels:
+            if not pygame.mixer.Channel(channel_id).get_busy():
+                return channel_id
+        return None
+
+    def play(self, name, sound, frame):
+        max_voices, priority, cooldown, reserved = self.settings.get(name, (None, 0, 0, False))
+        if cooldown and frame - self.last_played.get(name, -cooldown) < cooldown:
+            self.stats["cooldown"] += 1
+            return
+
+        channel_id = None
+        if max_voices:
+            voices = [channel_id for channel_id in list(self.playing) if self._busy(channel_id, name)]
+            if len(voices) >= max_voices:
+                channel_id = min(voices, key=lambda voice: self.playing[voice][2])
+                self.stats["stolen"] += 1
+        if channel_id is None:
+            channel_id = self._free_channel(reserved)
+        if channel_id is None:
+            # Take over the lowest-priority sound, if there is a lower one
+            candidates = [channel_id for channel_id in list(self.playing)
+                          if self._busy(channel_id, None) and (channel_id < self.reserved) == reserved]
+            if candidates:
+                lowest = min(candidates, key=lambda candidate: self.playing[candidate][1:])
+                if self.playing[lowest][1] < priority:
+                    channel_id = lowest
+                    self.stats["stolen"] += 1
+        if channel_id is None:
+            self.stats["dropped"] += 1
+            return
+
+        pygame.mixer.Channel(channel_id).play(sound)
+        self.playing[channel_id] = (name, priority, frame)
+        self.last_played[name] = frame
+        self.stats["played"] += 1
+
+_sound_manager = SoundManager()
+
+def configure_sound(name, max_voices=None, priority=0, cooldown=0, reserved=False):
+    _sound_manager.settings[name] = (max_voices, priority, cooldown, reserved)
+
+def set_sound_channels(total, reserved=0):
+    _init_mixer()
+    pygame.mixer.set_num_channels(total)
+    pygame.mixer.set_reserved(reserved)
+    _sound_manager.reserved = reserved
+
+def get_sound_stats():
+    stats = dict(_sound_manager.stats)
+    stats["active"] = sum(1 for channel_id in list(_sound_manager.playing) if _sound_manager._busy(channel_id, None))
+    return stats
 
 def play_sound(name):
-    if name in _sounds:
-        _sounds[name].play()
+    sound = _get_sound(name)
+    if sound is not None:
+        _sound_manager.play(name, sound, _world.frame_count)
+
+class TextCache:
+    # Fonts are kept per size; rendered text surfaces are kept in an LRU
+    # bounded by their total pixel memory.
+    def __init__(self, max_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            _init_font()
+            font = _preloader.result("font", size) or pygame.font.Font(None, size)
+            self.fonts[size] = font
+        return font
+
+    def render(self, text, size, color, antialias):
+        key = (text, size, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = self.get_font(size).render(text, antialias, color)
+        self.surfaces[key] = surface
+        self.bytes += surface.get_pitch() * surface.get_height()
+        self.trim()
+        return surface
+
+    def trim(self):
+        # Always keep the newest surface, even if it alone is over the limit
+        while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, old = self.surfaces.popitem(last=False)
+            self.bytes -= old.get_pitch() * old.get_height()
+
+    def clear(self):
+        self.surfaces.clear()
+        self.bytes = 0
+
+_text_cache = TextCache()
+
+def set_text_cache_size(max_bytes):
+    _text_cache.max_bytes = max_bytes
+    _text_cache.trim()
+
+def get_text_cache_stats():
+    return {
+        "hits": _text_cache.hits,
+        "misses": _text_cache.misses,
+        "entries": len(_text_cache.surfaces),
+        "bytes": _text_cache.bytes,
+        "fonts": len(_text_cache.fonts),
+    }
 
-def draw_text(text, x, y, size=30, color=(255, 255, 255), center=False):
-    font = pygame.font.Font(None, size)
-    surface = pygame.display.get_surface()
-    text_surface = font.render(text, True, color)
+def draw_text(text, x, y, size=30, color=(255, 255, 255), center=False, antialias=True):
+    # The color is part of the cache key, so it has to be hashable
+    color = color if type(color) is tuple else tuple(pygame.Color(color))
+    text_surface = _text_cache.render(str(text), size, color, antialias)
     rect = text_surface.get_rect()
     if center:
         rect.center = (x, y)
     else:
         rect.topleft = (x, y)
-    surface.blit(text_surface, rect)
+    # Queued rather than blitted so the render stage controls draw order
+    _world.text_queue.append((text_surface, rect))
+
+# -------------------------------------------------------------------
+# Frame profiler
+# Game calls lap() after each phase of a frame; the time since the
+# previous lap is charged to that phase.
+# -------------------------------------------------------------------
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(math.ceil(fraction * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+class Profiler:
+    def __init__(self, history=300, overlay=False, trace=False):
+        self.history = history
+        self.overlay = overlay
+        self.tracing = trace
+        self.frame_times = deque(maxlen=history)
+        self.phase_times = {}
+        self.trace = []
+        self.current = {}
+        self._frame_start = 0.0
+        self._last = 0.0
+        self._overlay_blits = []
+
+    def begin_frame(self):
+        self.current = {}
+        self._frame_start = self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + (now - self._last)
+        self._last = now
+
+    def lap_callback(self, function):
+        self.lap("on_update:" + getattr(function, "__name__", repr(function)))
+
+    def end_frame(self, frame):
+        total = time.perf_counter() - self._frame_start
+        self.frame_times.append(total)
+        for phase, seconds in self.current.items():
+            times = self.phase_times.get(phase)
+            if times is None:
+                times = self.phase_times[phase] = deque(maxlen=self.history)
+            times.append(seconds)
+        if self.tracing:
+            row = {"frame": frame, "total": total}
+            row.update(self.current)
+            self.trace.append(row)
+
+    def stats(self):
+        def summary(values):
+            ordered = sorted(values)
+            return {
+                "mean": 1000 * sum(ordered) / len(ordered) if ordered else 0.0,
+                "p50": 1000 * _percentile(ordered, 0.50),
+                "p95": 1000 * _percentile(ordered, 0.95),
+                "p99": 1000 * _percentile(ordered, 0.99),
+                "max": 1000 * ordered[-1] if ordered else 0.0,
+            }
+
+        result = summary(self.frame_times)  # all times in milliseconds
+        result["frames"] = len(self.frame_times)
+        result["phases"] = {phase: summary(times) for phase, times in self.phase_times.items()}
+        return result
+
+    def overlay_blits(self, frame, width):
+        # Re-rendered a couple of times a second so the numbers stay readable
+        if frame % 15 == 0 or not self._overlay_blits:
+            stats = self.stats()
+            lines = ["frame p50 %.1f  p95 %.1f  p99 %.1f  max %.1f ms" %
+                     (stats["p50"], stats["p95"], stats["p99"], stats["max"])]
+            slowest = sorted(stats["phases"].items(), key=lambda item: item[1]["mean"], reverse=True)
+            lines += ["%s %.2f ms" % (phase, phase_stats["mean"]) for phase, phase_stats in slowest[:6]]
+            self._overlay_blits = []
+            y = 4
+            for line in lines:
+                text_surface = _text_cache.render(line, 20, (255, 255, 0), True)
+                rect = text_surface.get_rect(topright=(width - 4, y))
+                self._overlay_blits.append((text_surface, rect))
+                y += rect.height
+        return self._overlay_blits
+
+    def dump_trace(self, path):
+        if path.endswith(".json"):
+            with open(path, "w") as file:
+                json.dump(self.trace, file)
+            return
+        columns = ["frame", "total"]
+        for row in self.trace:
+            columns.extend(key for key in row if key not in columns)
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=columns, restval=0)
+            writer.writeheader()
+            writer.writerows(self.trace)
+
+_profiler = None
+
+def enable_profiler(overlay=False, trace=False, history=300):
+    global _profiler
+    _profiler = Profiler(history, overlay, trace)
+    return _profiler
+
+def disable_profiler():
+    global _profiler
+    _profiler = None
+
+def get_frame_stats():
+    return _profiler.stats() if _profiler else None
+
+def dump_trace(path):
+    # Writes JSON if path ends in .json, otherwise CSV (one row per frame)
+    if _profiler is None:
+        raise RuntimeError("Call enable_profiler(trace=True) before dump_trace().")
+    _profiler.dump_trace(path)
 
 # -------------------------------------------------------------------
 # Game control
 # -------------------------------------------------------------------
 
 def end_game(message=None):
-    global _game_over, _end_message
-    _game_over = True
-    _end_message = message
+    _world.game_over = True
+    _world.end_message = message
 
 class Game:
     frame_count = 0  # class variable to track global frame count
 
-    def __init__(self, width=800, height=600, fps=30):
+    def __init__(self, width=800, height=600, fps=30, batch_draw=True, dirty_rects=False,
+                 fixed_timestep=False, tick_rate=None, max_catchup=5, interpolate=False,
+                 headless=False, render=True):
         if not (200 <= width <= 1600 and 200 <= height <= 1200):
             raise ValueError("Screen size must be between 200x200 and 1600x1200 for flexibility and compatibility.")
 
         self.width = width
         self.height = height
         self.fps = fps
-        self.screen = pygame.display.set_mode((width, height))
-        pygame.display.set_caption("Entity Game")
+        self.batch_draw = batch_draw
+        self.dirty_rects = dirty_rects
+        self.background = (0, 0, 0)
+        # With fixed_timestep, the simulation runs at tick_rate steps per
+        # second regardless of how fast frames render; fps caps rendering
+        self.fixed_timestep = fixed_timestep
+        self.tick_rate = tick_rate or fps
+        # Game time per step; with fps=0 (no frame cap) it is the real frame time
+        rate = self.tick_rate if fixed_timestep else fps
+        self.step_seconds = 1.0 / rate if rate else None
+        self._last_step = None  # perf_counter() at the last step, when step_seconds is None
+        self.max_catchup = max_catchup
+        self.interpolate = interpolate
+        self._previous = None
+        _world.screen_size = (width, height)
+        if _world.camera is None:
+            _world.bounds = (width, height)
+
+        # Headless games open no window, never wait on the clock and take
+        # input only from press_key() and friends. With render=False
+        # nothing is drawn at all.
+        self.headless = headless
+        self.render = render
+        if headless:
+            _world.input.live = False
+            if render:
+                # The dummy driver only for this display; SDL reads the
+                # variable at init, so the old value can go straight back
+                driver = os.environ.get("SDL_VIDEODRIVER")
+                os.environ["SDL_VIDEODRIVER"] = "dummy"
+                try:
+                    pygame.display.quit()
+                    pygame.display.init()
+                finally:
+                    if driver is None:
+                        del os.environ["SDL_VIDEODRIVER"]
+                    else:
+                        os.environ["SDL_VIDEODRIVER"] = driver
+                self.screen = pygame.display.set_mode((width, height))
+            else:
+                self.screen = pygame.Surface((width, height))
+        else:
+            if (pygame.display.get_init() and pygame.display.get_driver() == "dummy"
+                    and os.environ.get("SDL_VIDEODRIVER") != "dummy"):
+                pygame.display.quit()  # left over from a headless game
+            pygame.display.init()
+            self.screen = pygame.display.set_mode((width, height))
+            pygame.display.set_caption("Entity Game")
         self.clock = pygame.time.Clock()
         self.running = False
+        self._visible = []
+        self._drawn = None  # entity -> (rect, color, image, angle) as last shown, for dirty_rects
+        self._drawn_text = []
+        self._drawn_view = None
 
     def start(self):
-        global _entities
         self.running = True
+        if not self.headless and _preloader.busy():
+            self._show_loading_screen()
+        if self.headless:
+            self.run()
+        elif self.fixed_timestep:
+            self._run_fixed()
+        else:
+            while self.running:
+                if _profiler:
+                    _profiler.begin_frame()
+                self._step()
+                self._render()
+                self._tick()
+
+        pygame.quit()
+
+    def _show_loading_screen(self):
+        bar = pygame.Rect(0, 0, self.width // 2, 20)
+        bar.center = (self.width // 2, self.height // 2 + 30)
+        last = None
         while self.running:
-            Game.frame_count += 1
-            _input.update(Game.frame_count)
-            self.screen.fill((0, 0, 0))
+            done, total = _preloader.progress()
+            if (done, total) != last:
+                last = (done, total)
+                if _preloader.on_progress is not None:
+                    _preloader.on_progress(done, total)
+            if done >= total:
+                break
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    exit()
+            self.screen.fill(self.background)
+            text_surface = _text_cache.render("Loading...", 36, (255, 255, 255), True)
+            self.screen.blit(text_surface, text_surface.get_rect(center=(self.width // 2, self.height // 2 - 10)))
+            pygame.draw.rect(self.screen, (255, 255, 255), bar, 2)
+            filled = bar.inflate(-6, -6)
+            filled.width = int(filled.width * done / total) if total else 0
+            pygame.draw.rect(self.screen, (255, 255, 255), filled)
+            pygame.display.flip()
+            self.clock.tick(self.fps)
+        # Report loading errors now rather than mid-game
+        for kind, name in list(_preloader.futures):
+            _preloader.result(kind, name)
 
-            if not _game_over:
-                for update_function in _entity_behaviors:
-                    update_function()
+    def _tick(self):
+        if not self.headless:
+            self.clock.tick(self.fps)
+        if _profiler:
+            _profiler.lap("tick")
+            _profiler.end_frame(_world.frame_count)
 
-                _entities = [entity for entity in _entities if entity.alive]
+    def run(self, frames=None):
+        # Step the game until it ends or `frames` steps have run, without
+        # waiting between frames when headless. Returns a summary.
+        self.running = True
+        start_frame = _world.frame_count
+        while self.running and not _world.game_over:
+            if frames is not None and _world.frame_count - start_frame >= frames:
+                break
+            if _profiler:
+                _profiler.begin_frame()
+            self._step()
+            if self.render:
+                self._render()
+            self._tick()
+        self.running = False
+        return {
+            "frames": _world.frame_count - start_frame,
+            "game_over": _world.game_over,
+            "end_message": _world.end_message,
+        }
+
+    def _run_fixed(self):
+        step_time = 1.0 / self.tick_rate
+        lag = 0.0
+        last = time.perf_counter()
+        while self.running:
+            if _profiler:
+                _profiler.begin_frame()
+            now = time.perf_counter()
+            lag += now - last
+            last = now
 
-                for entity in get_all():
+            steps = 0
+            while lag >= step_time and self.running:
+                if steps == self.max_catchup:
+                    # Too far behind to catch up: drop the backlog rather
+                    # than spiral into ever longer frames
+                    lag = 0.0
+                    break
+                if self.interpolate:
+                    self._remember_positions()
+                self._step()
+                lag -= step_time
+                steps += 1
+
+            alpha = lag / step_time if self.interpolate else 1.0
+            self._render(alpha)
+            self._tick()
+
+    def _remember_positions(self):
+        if _world.store is not None:
+            n = _world.store.size
+            self._previous = (_world.store.x[:n].copy(), _world.store.y[:n].copy())
+        else:
+            self._previous = {entity: (entity.x, entity.y) for entity in _world.active_entities()}
+
+    def _step(self):
+        if _scenes.step():
+            self._previous = None  # positions from the old scene mean nothing now
+        world = _world
+        profiler = _profiler
+        world.frame_count += 1
+        Game.frame_count = world.frame_count  # kept for games that read it directly
+        world.input.update(world.frame_count)
+        world.text_queue.clear()
+        if profiler:
+            profiler.lap("input")
+
+        if not world.game_over:
+            elapsed = self.step_seconds
+            if elapsed is None:
+                # Measured here rather than with the clock, which is never
+                # ticked when headless
+                now = time.perf_counter()
+                elapsed = now - self._last_step if self._last_step is not None else 0.0
+                self._last_step = now
+            world.scheduler.run(elapsed)
+            if profiler:
+                profiler.lap("timers")
+            world.tweens.step()
+            if profiler:
+                profiler.lap("tweens")
+            for update_function in world.behaviors:
+                update_function()
+                if profiler:
+                    profiler.lap_callback(update_function)
+
+            if world.store is not None:
+                world.store.step(*world.bounds)
+            else:
+                for entity in world.active_entities():
                     entity.update()
-                    entity.draw(self.screen)
+            # update() moved everything: rebuild the grid on the next query
+            world.spatial_dirty = True
+            world.moved.clear()
+            if world.camera is not None:
+                world.camera.step(world)
+            world.remove_dead()
+            if profiler:
+                profiler.lap("update")
+            if world.collision_rules:
+                _resolve_collisions(world)
+                if profiler:
+                    profiler.lap("collisions")
+            if world.camera is None or world.store is not None:
+                self._visible = world.entities
+            else:
+                self._visible = world.camera.visible(world)
+        else:
+            self._visible = []
 
-            if _game_over and _end_message:
-                draw_text(_end_message, self.width // 2, self.height // 2, size=72, color=(255, 255, 255), center=True)
+        if world.game_over and world.end_message:
+            draw_text(world.end_message, self.width // 2, self.height // 2, size=72, color=(255, 255, 255), center=True)
 
-            pygame.display.flip()
-            self.clock.tick(self.fps)
+    def _render(self, alpha=1.0):
+        # alpha < 1 draws entities part way between their previous and
+        # current simulated positions (fixed_timestep with interpolate)
+        previous = self._previous if alpha < 1.0 else None
+        if self.dirty_rects:
+            self._render_dirty(previous, alpha)
+            return
 
-        pygame.quit()
+        profiler = _profiler
+        camera = _world.camera
+        offset = camera.offset() if camera is not None else (0, 0)
+        self.screen.fill(self.background)
+        if profiler:
+            profiler.lap("clear")
+        if _world.tilemap is not None:
+            _world.tilemap.draw(self.screen, offset=offset)
+            _world.tilemap.changed = []  # only dirty_rects needs them
+            if profiler:
+                profiler.lap("tilemap")
+        for text_surface, rect in _world.text_queue:
+            self.screen.blit(text_surface, rect)
+        if profiler:
+            profiler.lap("text")
+        if _world.store is not None and self._visible:
+            _world.store.draw(self.screen, previous, alpha, offset, camera.view() if camera is not None else None)
+        elif self.batch_draw:
+            _draw_entities(self.screen, self._visible, previous, alpha, offset)
+        else:
+            for entity in self._visible:
+                _draw_at_offset(self.screen, entity, offset)
+        if profiler:
+            if profiler.overlay:
+                self.screen.blits(profiler.overlay_blits(_world.frame_count, self.width), doreturn=False)
+            profiler.lap("draw")
+        pygame.display.flip()
+        if profiler:
+            profiler.lap("flip")
+
+    def _render_dirty(self, previous_positions=None, alpha=1.0):
+        # Erase and redraw only what changed since the last frame, then
+        # push just those regions to the display
+        screen = self.screen
+        if not self.batch_draw:
+            previous_positions = None  # drawn one by one, which never interpolates
+        elif previous_positions is not None and _world.store is not None:
+            # The store remembers arrays; look up the visible entities' rows
+            old_x, old_y = previous_positions
+            count = len(old_x)
+            previous_positions = {entity: (old_x[entity._index], old_y[entity._index])
+                                  for entity in self._visible if 0 <= entity._index < count}
+        camera = _world.camera
+        offset = camera.offset() if camera is not None else (0, 0)
+        if (_world, offset) != self._drawn_view:
+            self._drawn = None  # the camera moved or the scene changed: redraw it all
+            self._drawn_view = (_world, offset)
+        if self._drawn is None:
+            screen.fill(self.background)
+            previous = {}
+            dirty = [screen.get_rect()]
+        else:
+            previous = self._drawn
+            dirty = []
+        if _profiler:
+            _profiler.lap("clear")
+
+        current = {}
+        for entity in self._visible:
+            # The area actually drawn: a rotated image overhangs the entity
+            x, y = entity._x, entity._y
+            if previous_positions is not None:
+                old = previous_positions.get(entity)
+                if old is not None:
+                    x = old[0] + (x - old[0]) * alpha
+                    y = old[1] + (y - old[1]) * alpha
+            x += offset[0]
+            y += offset[1]
+            if entity.image is None:
+                rect = _cover_rect(x, y, entity._width, entity._height)
+            else:
+                surface, image_x, image_y = _assets.variant(entity.image, int(entity._width), int(entity._height),
+                                                            entity.angle)
+                rect = _cover_rect(x + image_x, y + image_y, surface.get_width(), surface.get_height())
+            state = (rect, entity.color, entity.image, entity.angle)
+            current[entity] = state
+            old = previous.pop(entity, None)
+            if old != state:
+                dirty.append(state[0])
+                if old is not None:
+                    dirty.append(old[0])
+        for old in previous.values():
+            dirty.append(old[0])
+
+        tilemap = _world.tilemap
+        if tilemap is not None and tilemap.changed:
+            dirty.extend(rect.move(offset) for rect in tilemap.changed)
+            tilemap.changed = []
+
+        texts = [(text_surface, rect) for text_surface, rect in _world.text_queue]
+        if _profiler and _profiler.overlay:
+            texts.extend(_profiler.overlay_blits(_world.frame_count, self.width))
+        if texts != self._drawn_text:
+            dirty.extend(rect for _, rect in self._drawn_text)
+            dirty.extend(rect for _, rect in texts)
+
+        self._drawn = current
+        self._drawn_text = texts
+        if not dirty:
+            return
+
+        for rect in dirty:
+            screen.fill(self.background, rect)
+            if tilemap is not None:
+                tilemap.draw(screen, rect, offset)
+        for text_surface, rect in texts:
+            if rect.collidelist(dirty) != -1:
+                screen.blit(text_surface, rect)
+        redraw = [entity for entity, state in current.items() if state[0].collidelist(dirty) != -1]
+        if self.batch_draw:
+            _draw_entities(screen, redraw, previous_positions, alpha, offset)
+        else:
+            for entity in redraw:
+                _draw_at_offset(screen, entity, offset)
+        if _profiler:
+            _profiler.lap("draw")
+        pygame.display.update(dirty)
+        if _profiler:
+            _profiler.lap("flip")
+
+# -------------------------------------------------------------------
+# Running many headless games
+# -------------------------------------------------------------------
+
+def _run_one(job):
+    game_factory, seed, frames = job
+    new_world()
+    random.seed(seed)
+    game = game_factory(seed)
+    result = game.run(frames)
+    result["seed"] = seed
+    result["score"] = _world.score
+    return result
+
+def run_many(game_factory, seeds, workers=None, frames=None):
+    # game_factory(seed) sets up a fresh game and returns a headless Game.
+    # It must be a module-level function so worker processes can find it.
+    # Each game gets its own World; results come back in seed order.
+    jobs = [(game_factory, seed, frames) for seed in seeds]
+    if workers == 1:
+        return [_run_one(job) for job in jobs]
+    # close() and join() rather than the context manager: terminate()
+    # can hang on workers where SDL has installed its signal handlers
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(_run_one, jobs)
+    finally:
+        pool.close()
+        pool.join()
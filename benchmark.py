@@ -0,0 +1,277 @@
+# -------------------------------------------------------------------
+# pynovi benchmark suite
+#
+#   python benchmark.py                    run every scene and print results
+#   python benchmark.py --save-baseline    also store results as the baseline
+#   python benchmark.py --compare          run and compare against the baseline
+#
+# Every scene runs headless (no window, no frame cap) in its own process,
+# so module state and peak memory are measured per scene.
+# -------------------------------------------------------------------
+import argparse
+import json
+import os
+import random
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# -------------------------------------------------------------------
+# Constants
+# -------------------------------------------------------------------
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, "benchmark_baseline.json")
+DEFAULT_FRAMES = 600
+DEFAULT_THRESHOLD = 0.10  # flag anything more than 10% slower
+WIDTH, HEIGHT = 800, 600
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]
+
+# -------------------------------------------------------------------
+# Scenes
+# Each scene sets up a game using the public API and returns the Game.
+# -------------------------------------------------------------------
+def demo_scene(filename):
+    """Run one of the demo scripts, forcing its Game to be headless."""
+    def setup(pn, frames):
+        original_init = pn.Game.__init__
+
+        def headless_init(self, *args, **kwargs):
+            kwargs["headless"] = True
+            original_init(self, *args, **kwargs)
+            created.append(self)
+
+        created = []
+        pn.Game.__init__ = headless_init
+        pn.Game.start = lambda self: None  # the harness runs it instead
+        runpy.run_path(os.path.join(HERE, filename), run_name="__main__")
+        return created[0]
+    return setup
+
+def moving_entities_scene(count, array_backend=False):
+    """`count` entities crossing the screen, replaced as they leave it."""
+    def setup(pn, frames):
+        if array_backend:
+            pn.use_array_backend(count)
+
+        def spawn():
+            world = pn.get_world()
+            for _ in range(count - len(world.entities)):
+                pn.create_entity(x=random.uniform(0, WIDTH - 4), y=random.uniform(0, HEIGHT - 4),
+                                 width=4, height=4, color=random.choice(COLORS),
+                                 dx=random.uniform(-3, 3), dy=random.uniform(-3, 3))
+        spawn()
+        pn.on_update(spawn)
+        return pn.Game(WIDTH, HEIGHT, headless=True)
+    return setup
+
+def collision_scene(count):
+    """`count` bullets each asking which of `count` targets they touch."""
+    def setup(pn, frames):
+        for _ in range(count):
+            pn.create_entity(x=random.uniform(0, WIDTH - 20), y=random.uniform(0, HEIGHT - 20),
+                             width=20, height=20, color=(255, 0, 0))
+        bullets = []
+
+        def fire():
+            bullets[:] = [bullet for bullet in bullets if bullet.alive]
+            while len(bullets) < count:
+                bullets.append(pn.create_entity(x=random.uniform(0, WIDTH), y=HEIGHT,
+                                                width=4, height=10, color=(255, 255, 0), dy=-8))
+
+        def hits():
+            for bullet in bullets:
+                for target in pn.get_touching(bullet):
+                    if target.dy == 0:
+                        pn.destroy(bullet)
+                        break
+
+        fire()
+        pn.on_update(fire)
+        pn.on_update(hits)
+        return pn.Game(WIDTH, HEIGHT, headless=True)
+    return setup
+
+def text_hud_scene(lines):
+    """A HUD of `lines` lines of changing text drawn every frame."""
+    def setup(pn, frames):
+        def hud():
+            frame = pn.get_world().frame_count
+            for line in range(lines):
+                pn.draw_text(f"Line {line}: {(frame // 10 + line) % 100}", 10, 10 + line * 12, size=16)
+        pn.on_update(hud)
+        return pn.Game(WIDTH, HEIGHT, headless=True)
+    return setup
+
+def tilemap_scene(size):
+    """A `size` x `size` random maze drawn as a tilemap, with one mover."""
+    def setup(pn, frames):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+            for _ in range(size):
+                file.write("".join("#" if random.random() < 0.3 else "." for _ in range(size)) + "\n")
+        pn.load_tilemap(file.name, tile_size=8)
+        os.remove(file.name)
+        player = pn.create_entity(x=0, y=0, width=6, height=6, color=(0, 255, 0), dx=1, dy=1)
+        pn.on_update(lambda: pn.is_touching_tiles(player))
+        return pn.Game(WIDTH, HEIGHT, headless=True)
+    return setup
+
+def camera_scene(count, world_size):
+    """`count` wandering entities in a large world, seen through a camera that follows a player."""
+    def setup(pn, frames):
+        pn.set_camera(world_size, world_size, offscreen="sleep")
+        for _ in range(count):
+            pn.create_entity(x=random.uniform(0, world_size), y=random.uniform(0, world_size),
+                             width=8, height=8, color=random.choice(COLORS),
+                             dx=random.uniform(-1, 1), dy=random.uniform(-1, 1))
+        player = pn.create_entity(x=0, y=0, width=16, height=16, color=(255, 255, 255), dx=6, dy=4)
+        pn.follow(player)
+        return pn.Game(WIDTH, HEIGHT, headless=True)
+    return setup
+
+def tween_scene(count):
+    """`count` entities bouncing between two points with eased tweens."""
+    def setup(pn, frames):
+        def bounce(entity, x, y):
+            def back():
+                pn.tween(entity, x=x, y=y, frames=40, easing="ease_in_out", on_complete=lambda: bounce(entity, x, y))
+            pn.tween(entity, x=WIDTH - x, y=HEIGHT - y, frames=40, easing="ease_in_out", on_complete=back)
+
+        for _ in range(count):
+            x, y = random.uniform(0, WIDTH - 8), random.uniform(0, HEIGHT - 8)
+            bounce(pn.create_entity(x=x, y=y, width=8, height=8, color=random.choice(COLORS)), x, y)
+        return pn.Game(WIDTH, HEIGHT, headless=True)
+    return setup
+
+SCENES = {
+    "demo_spaceinvaders": demo_scene("demo_spaceinvaders.py"),
+    "demo_avoidfallingblocks": demo_scene("demo_avoidfallingblocks.py"),
+    "demo_bouncingball": demo_scene("demo_bouncingball.py"),
+    "entities_1000": moving_entities_scene(1000),
+    "entities_10000": moving_entities_scene(10000),
+    "entities_10000_array": moving_entities_scene(10000, array_backend=True),
+    "collisions_500": collision_scene(500),
+    "text_hud_40": text_hud_scene(40),
+    "tilemap_200": tilemap_scene(200),
+    "camera_50000": camera_scene(50000, 20000),
+    "tweens_500": tween_scene(500),
+}
+
+# -------------------------------------------------------------------
+# Running a scene (inside its own process)
+# -------------------------------------------------------------------
+def peak_memory_kb():
+    """Peak resident memory of this process in KB, or None where it can't be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024  # macOS reports bytes, Linux kilobytes
+    return peak
+
+def run_scene(name, frames):
+    """Run one scene in this process and return its measurements."""
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.chdir(HERE)  # demos load assets with relative paths
+    sys.path.insert(0, HERE)
+
+    start = time.perf_counter()
+    import _pynovi as pn
+    import_ms = 1000 * (time.perf_counter() - start)
+
+    random.seed(1)
+    game = SCENES[name](pn, frames)
+    pn.enable_profiler(history=frames)
+    start = time.perf_counter()
+    result = game.run(frames)
+    elapsed = time.perf_counter() - start
+
+    stats = pn.get_frame_stats()
+    return {
+        "frames": result["frames"],
+        "fps": result["frames"] / elapsed if elapsed else 0.0,
+        "frame_ms": {key: stats[key] for key in ("mean", "p50", "p95", "p99", "max")},
+        "phase_ms": {phase: phase_stats["mean"] for phase, phase_stats in stats["phases"].items()},
+        "peak_memory_kb": peak_memory_kb(),
+        "import_ms": import_ms,
+    }
+
+def run_in_subprocess(name, frames):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--scene", name, "--frames", str(frames)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    # pygame prints a greeting; the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+# -------------------------------------------------------------------
+# Reporting and comparison
+# -------------------------------------------------------------------
+def print_results(results):
+    print(f"{'scene':26} {'fps':>9} {'p95 ms':>8} {'peak MB':>8} {'import ms':>9}  slowest phases")
+    for name, result in results.items():
+        phases = sorted(result["phase_ms"].items(), key=lambda item: item[1], reverse=True)[:3]
+        phase_text = ", ".join(f"{phase} {ms:.2f}" for phase, ms in phases)
+        peak_kb = result["peak_memory_kb"]
+        peak_text = f"{peak_kb / 1024:8.1f}" if peak_kb is not None else f"{'n/a':>8}"
+        print(f"{name:26} {result['fps']:9.1f} {result['frame_ms']['p95']:8.2f} "
+              f"{peak_text} {result['import_ms']:9.1f}  {phase_text}")
+
+def compare(results, baseline, threshold):
+    """Print the change per scene and return the names of scenes that regressed."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or not old["fps"]:
+            continue
+        change = (result["fps"] - old["fps"]) / old["fps"]
+        marker = "REGRESSION" if change < -threshold else "ok"
+        print(f"{name:26} {old['fps']:9.1f} -> {result['fps']:9.1f} fps ({change:+.1%})  {marker}")
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+# -------------------------------------------------------------------
+# Main Program
+# -------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pynovi scenes headless.")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES)
+    parser.add_argument("--only", nargs="*", help="scene names to run (default: all)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--scene", help=argparse.SUPPRESS)  # used for the per-scene subprocess
+    args = parser.parse_args()
+
+    if args.scene:
+        print(json.dumps(run_scene(args.scene, args.frames)))
+        return 0
+
+    names = args.only or list(SCENES)
+    results = {name: run_in_subprocess(name, args.frames) for name in names}
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} scene(s) slower than baseline by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,8 +23,6 @@ SPAWN_RATE = 30  # frames between block spawns
 # Global Variables
 # -------------------------------------------------------------------
 player = None
-blocks = []
-frame_counter = 0
 game_running = True
 
 # -------------------------------------------------------------------
@@ -42,36 +40,27 @@ def control():
 def spawn_block():
     """Create a new falling block at a random x-position."""
     x = random.randint(0, WIDTH - BLOCK_WIDTH)
-    block = pn.create_entity(
+    pn.create_entity(
         x=x, y=0,
         width=BLOCK_WIDTH, height=BLOCK_HEIGHT,
         color=BLOCK_COLOR,
-        dy=BLOCK_SPEED
+        dy=BLOCK_SPEED,
+        group="block"
     )
-    blocks.append(block)
 
 def update_blocks():
-    """Remove off-screen blocks and check for collisions."""
+    """Check whether any falling block has hit the player."""
     global game_running
     if not game_running:
         return
 
-    for block in blocks:
+    # The "block" group only holds blocks that are still on screen
+    for block in pn.get_group("block"):
         if block.alive and block.is_touching(player):
             game_running = False
             pn.end_game("GAME OVER")
             break
 
-    # Remove any dead blocks
-    blocks[:] = [b for b in blocks if b.alive]
-
-def spawn_logic():
-    """Spawn new blocks at fixed intervals."""
-    global frame_counter
-    frame_counter += 1
-    if frame_counter % SPAWN_RATE == 0:
-        spawn_block()
-
 # -------------------------------------------------------------------
 # Main Program
 # -------------------------------------------------------------------
@@ -84,7 +73,7 @@ player = pn.create_entity(
 )
 
 pn.on_update(control)
-pn.on_update(spawn_logic)
+pn.every(SPAWN_RATE, spawn_block)
 pn.on_update(update_blocks)
 
 game = pn.Game(WIDTH, HEIGHT)